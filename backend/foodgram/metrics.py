@@ -0,0 +1,321 @@
+import atexit
+import fcntl
+import glob
+import hmac
+import json
+import os
+import time
+from collections import defaultdict
+from threading import Lock
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+UNMATCHED_ROUTE = 'unmatched'
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+ARCHIVE_NAME = 'archive'
+
+
+def lock_file(path, blocking=True):
+    """
+    Открытый файл с исключительной блокировкой flock или None,
+    если без ожидания блокировку взять не удалось.
+    """
+
+    file = open(path, 'a')
+    flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+    try:
+        fcntl.flock(file, flags)
+    except BlockingIOError:
+        file.close()
+        return None
+    return file
+
+
+def read_routes(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_routes(path, routes):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(routes, file)
+    os.replace(temporary, path)
+
+
+def new_route_metrics():
+    return {
+        'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+        'duration': 0,
+        'queries': 0,
+        'sql_duration': 0,
+        'response_bytes': 0,
+        'statuses': defaultdict(int),
+    }
+
+
+def merge_routes(routes, process_routes):
+    for key, process_metrics in process_routes.items():
+        metrics = routes[key]
+        for index, count in enumerate(process_metrics['buckets']):
+            metrics['buckets'][index] += count
+        for name in (
+            'duration', 'queries', 'sql_duration', 'response_bytes'
+        ):
+            metrics[name] += process_metrics[name]
+        for status, count in process_metrics['statuses'].items():
+            metrics['statuses'][status] += count
+
+
+class MetricsStore:
+    """
+    Метрики запросов процесса с выгрузкой в отдельный файл.
+    Каждый процесс gunicorn пишет свой файл в METRICS_DIR, при выдаче
+    метрик файлы всех процессов суммируются.
+    Пока процесс жив, он держит flock на своем файле .owner. Файлы
+    завершившихся процессов при выдаче метрик переносятся в общий
+    архив, поэтому счетчики не убывают, а каталог не растет.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.pid = None
+
+    def reset(self):
+        self.pid = os.getpid()
+        name = os.path.join(
+            settings.METRICS_DIR, f'{self.pid}-{uuid4().hex[:8]}')
+        self.path = f'{name}.json'
+        self.routes = defaultdict(new_route_metrics)
+        self.flushed_at = 0
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        self.owner = lock_file(f'{name}.owner.tmp')
+        os.replace(f'{name}.owner.tmp', f'{name}.owner')
+
+    def observe(self, route, method, status, duration, queries,
+                sql_duration, response_bytes):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.reset()
+            metrics = self.routes[f'{route} {method}']
+            bucket = next(
+                (index for index, bound in enumerate(LATENCY_BUCKETS)
+                 if duration <= bound),
+                len(LATENCY_BUCKETS),
+            )
+            metrics['buckets'][bucket] += 1
+            metrics['duration'] += duration
+            metrics['queries'] += queries
+            metrics['sql_duration'] += sql_duration
+            metrics['response_bytes'] += response_bytes
+            metrics['statuses'][str(status)] += 1
+        if time.monotonic() - self.flushed_at >= (
+                settings.METRICS_FLUSH_INTERVAL):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                return
+            write_routes(self.path, self.routes)
+            self.flushed_at = time.monotonic()
+
+    def prune(self):
+        """
+        Перенос счетчиков завершившихся процессов в архив.
+        """
+
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        with lock_file(os.path.join(directory, f'{ARCHIVE_NAME}.lock')):
+            dead = []
+            for owner_path in glob.glob(os.path.join(directory, '*.owner')):
+                owner = lock_file(owner_path, blocking=False)
+                if owner is not None:
+                    dead.append((owner_path, owner))
+            if not dead:
+                return
+            archive_path = os.path.join(directory, f'{ARCHIVE_NAME}.json')
+            archive = defaultdict(new_route_metrics)
+            merge_routes(archive, read_routes(archive_path))
+            for owner_path, _ in dead:
+                merge_routes(
+                    archive, read_routes(f'{owner_path[:-6]}.json'))
+            write_routes(archive_path, archive)
+            for owner_path, owner in dead:
+                for path in (f'{owner_path[:-6]}.json', owner_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                owner.close()
+
+    def collect(self):
+        """
+        Сумма метрик всех процессов.
+        """
+
+        self.flush()
+        self.prune()
+        routes = defaultdict(new_route_metrics)
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+            merge_routes(routes, read_routes(path))
+        return routes
+
+
+store = MetricsStore()
+atexit.register(store.flush)
+
+
+class QueryCounter:
+    """
+    Счетчик запросов к БД и их времени через execute_wrapper.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Сбор метрик по маршрутам: время ответа, запросы к БД, размер
+    и статус ответа. Включается настройкой METRICS_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def observe(self, request, response, started, counter, size):
+        match = request.resolver_match
+        store.observe(
+            route=match.url_name if match else UNMATCHED_ROUTE,
+            method=request.method,
+            status=response.status_code,
+            duration=time.perf_counter() - started,
+            queries=counter.count,
+            sql_duration=counter.duration,
+            response_bytes=size,
+        )
+
+    def stream(self, request, response, content, started, counter):
+        size = 0
+        with connection.execute_wrapper(counter):
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        self.observe(request, response, started, counter, size)
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content,
+                started, counter,
+            )
+            return response
+        self.observe(request, response, started, counter,
+                     len(response.content))
+        return response
+
+
+def format_labels(route, method, **extra):
+    labels = {'route': route, 'method': method, **extra}
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def render_metrics(routes):
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(
+            f'{name}{{{labels}}} {value}' for labels, value in samples)
+
+    items = sorted(
+        (key.split(' ', 1), metrics) for key, metrics in routes.items())
+    metric(
+        'foodgram_http_requests_total', 'counter',
+        'Количество ответов по маршрутам и статусам.',
+        [
+            (format_labels(route, method, status=status), count)
+            for (route, method), metrics in items
+            for status, count in sorted(metrics['statuses'].items())
+        ],
+    )
+    histogram = []
+    for (route, method), metrics in items:
+        total = 0
+        for bound, count in zip(
+                (*LATENCY_BUCKETS, '+Inf'), metrics['buckets']):
+            total += count
+            histogram.append((
+                'foodgram_http_request_duration_seconds_bucket',
+                format_labels(route, method, le=bound), total))
+        labels = format_labels(route, method)
+        histogram.append((
+            'foodgram_http_request_duration_seconds_sum', labels,
+            metrics['duration']))
+        histogram.append((
+            'foodgram_http_request_duration_seconds_count', labels, total))
+    lines.append(
+        '# HELP foodgram_http_request_duration_seconds Время ответа.')
+    lines.append('# TYPE foodgram_http_request_duration_seconds histogram')
+    lines.extend(
+        f'{name}{{{labels}}} {value}' for name, labels, value in histogram)
+    for name, field, help_text in (
+        ('foodgram_db_queries_total', 'queries',
+         'Количество запросов к БД.'),
+        ('foodgram_db_query_duration_seconds_total', 'sql_duration',
+         'Суммарное время запросов к БД.'),
+        ('foodgram_http_response_size_bytes_total', 'response_bytes',
+         'Суммарный размер ответов.'),
+    ):
+        metric(name, 'counter', help_text, [
+            (format_labels(route, method), metrics[field])
+            for (route, method), metrics in items
+        ])
+    return '\n'.join(lines) + '\n'
+
+
+def is_metrics_request_allowed(request):
+    """
+    Доступ по заголовку Authorization: Bearer METRICS_TOKEN.
+    Без заданного токена метрики не отдаются никому.
+    """
+
+    if not settings.METRICS_TOKEN:
+        return False
+    return hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(),
+        f'Bearer {settings.METRICS_TOKEN}'.encode(),
+    )
+
+
+def metrics_view(request):
+    if not is_metrics_request_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(store.collect()), content_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,138 @@
+import logging
+import os
+import re
+import time
+import traceback
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger('foodgram.queries')
+
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+VISIBLE_PARAMS = (bool, int, float, Decimal, date, datetime)
+REDACTED = '<скрыто>'
+
+
+def get_sql_shape(sql):
+    """
+    Вид запроса без учета длины списков в IN.
+    """
+
+    return IN_LIST.sub('(%s, ...)', sql)
+
+
+def redact(params):
+    """
+    Параметры запроса без строк: в них бывают email, токены и пароли.
+    """
+
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {name: redact(value) for name, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [redact(value) for value in params]
+    if isinstance(params, VISIBLE_PARAMS):
+        return params
+    return REDACTED
+
+
+def get_app_stack():
+    """
+    Последние кадры стека из кода проекта.
+    """
+
+    base_dir = os.path.join(settings.BASE_DIR, '')
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(base_dir)
+        and frame.filename != __file__
+    ]
+    return [
+        f'{os.path.relpath(frame.filename, base_dir)}:{frame.lineno} '
+        f'in {frame.name}'
+        for frame in frames[-settings.QUERY_LOG_STACK_DEPTH:]
+    ]
+
+
+def get_view_name(request, view_func):
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', str(view_func))
+    actions = getattr(view_func, 'actions', None) or {}
+    method = request.method.lower()
+    return f'{cls.__name__}.{actions.get(method, method)}'
+
+
+class QueryLogger:
+    """
+    Журнал медленных и повторяющихся запросов одного HTTP-запроса.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.view = None
+        self.shapes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.observe(sql, params, time.perf_counter() - started)
+
+    def observe(self, sql, params, duration):
+        shape = self.shapes.setdefault(
+            get_sql_shape(sql), {'count': 0, 'duration': 0, 'stack': None})
+        shape['count'] += 1
+        shape['duration'] += duration
+        if shape['count'] == settings.QUERY_REPEAT_LIMIT + 1:
+            shape['stack'] = get_app_stack()
+        if duration >= settings.SLOW_QUERY_THRESHOLD:
+            logger.warning(
+                'Медленный запрос %.1f мс в %s %s (%s)\n%s\nПараметры: %r\n'
+                'Стек:\n  %s',
+                duration * 1000, self.request.method, self.request.path,
+                self.view, sql, redact(params),
+                '\n  '.join(get_app_stack()),
+            )
+
+    def report(self):
+        for sql, shape in self.shapes.items():
+            if shape['count'] <= settings.QUERY_REPEAT_LIMIT:
+                continue
+            logger.warning(
+                'Возможно N+1: запрос выполнен %d раз за %.1f мс в %s %s '
+                '(%s)\n%s\nСтек:\n  %s',
+                shape['count'], shape['duration'] * 1000,
+                self.request.method, self.request.path, self.view, sql,
+                '\n  '.join(shape['stack']),
+            )
+
+
+class QueryLogMiddleware:
+    """
+    Журнал медленных запросов к БД и признаков N+1 с указанием
+    представления и строк кода, из которых пришел запрос.
+    Включается настройкой QUERY_LOG_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_LOG_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_logger = QueryLogger(request)
+        try:
+            with connection.execute_wrapper(request.query_logger):
+                return self.get_response(request)
+        finally:
+            request.query_logger.report()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_logger.view = get_view_name(request, view_func)
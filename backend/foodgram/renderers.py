@@ -0,0 +1,32 @@
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    Вывод JSON через orjson.
+    Ответ такой же, как у JSONRenderer с настройками по умолчанию:
+    компактный, в UTF-8, с экранированными U+2028 и U+2029, даты
+    и Decimal преобразует кодировщик DRF.
+    Отступ из заголовка Accept поддерживается только в два пробела.
+    """
+
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if accepted_media_type and 'indent=' in accepted_media_type:
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(
+            data, default=self.encoder.default, option=options,
+        ).replace(
+            b'\xe2\x80\xa8', b'\\u2028'
+        ).replace(
+            b'\xe2\x80\xa9', b'\\u2029'
+        )
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
+    'jobs.apps.JobsConfig',
 
     'rest_framework',
     'djoser',
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
+    'foodgram.querylog.QueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,6 +96,71 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            default='foodgram'),
+    }
+}
+
+RECIPE_CACHE_TIMEOUT = 60 * 60 * 24
+RECIPE_FAST_READ = True
+
+TOKEN_CACHE_TIMEOUT = 60
+
+INGREDIENT_SEARCH_LIMIT = 20
+CATALOGUE_INDEX_CHECK_INTERVAL = 1
+
+CATALOGUE_CACHE_MAX_AGE = 0
+
+RECIPE_IMAGE_SIZES = {
+    'card': '480x270',
+    'detail': '960x540',
+    'retina': '1920x1080',
+}
+RECIPE_IMAGE_QUALITY = 80
+THUMBNAIL_UPSCALE = False
+
+FEED_FANOUT_LIMIT = 1000
+
+JOBS_MAX_ATTEMPTS = 3
+JOBS_VISIBILITY_TIMEOUT = 60 * 5
+JOBS_RETRY_DELAY = 10
+JOBS_POLL_INTERVAL = 1
+JOBS_RETENTION_DAYS = 7
+JOBS_PURGE_INTERVAL = 60 * 60
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False') == 'True'
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = 1
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+QUERY_LOG_ENABLED = os.getenv('QUERY_LOG_ENABLED', 'False') == 'True'
+SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 0.1))
+QUERY_REPEAT_LIMIT = int(os.getenv('QUERY_REPEAT_LIMIT', 10))
+QUERY_LOG_STACK_DEPTH = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'foodgram.queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -113,12 +181,19 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated'
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'foodgram.renderers.ORJSONRenderer',
     ],
     'DEFAULT_PAGINATION_CLASS': 'recipes.paginations.LimitPageNumberPagination',
     'PAGE_SIZE': 6
 }
 
+if DEBUG:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+        'rest_framework.renderers.BrowsableAPIRenderer')
+
 
 LANGUAGE_CODE = 'ru-RU'
 
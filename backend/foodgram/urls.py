@@ -1,7 +1,14 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
+from foodgram.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include('recipes.urls', namespace='recipes')),
 ]
+
+if settings.METRICS_ENABLED:
+    urlpatterns.append(path('api/metrics', metrics_view, name='metrics'))
+
+urlpatterns.append(path('api/', include('recipes.urls', namespace='recipes')))
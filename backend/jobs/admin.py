@@ -0,0 +1,28 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+
+    list_display = (
+        'id',
+        'name',
+        'status',
+        'attempts',
+        'created',
+        'get_wait',
+        'duration',
+        'worker',
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+    readonly_fields = (
+        'attempts', 'worker', 'locked_until', 'created',
+        'started_at', 'finished_at', 'duration', 'error',
+    )
+
+    @admin.display(description='Ожидание, с')
+    def get_wait(self, obj):
+        return obj.wait
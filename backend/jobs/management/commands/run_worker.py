@@ -0,0 +1,72 @@
+import multiprocessing
+import signal
+
+from django.core.management import BaseCommand
+from django.db import connections
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+
+    help = 'Запуск обработчика фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Количество процессов',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=1,
+            help='Количество потоков в каждом процессе',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=None,
+            help='Пауза между опросами пустой очереди, с',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться',
+        )
+
+    def run_worker(self, options):
+        worker = Worker(
+            threads=options['threads'],
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+            log=self.stdout.write,
+        )
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        worker.run()
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            self.run_worker(options)
+            self.stdout.write(self.style.SUCCESS('Обработчик остановлен!'))
+            return
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=self.run_worker, args=(options,))
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+
+        def stop(*args):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for process in processes:
+            process.join()
+        self.stdout.write(self.style.SUCCESS('Обработчики остановлены!'))
@@ -0,0 +1,243 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+class JobManager(models.Manager):
+
+    def enqueue(self, name, args=(), kwargs=None, delay=0,
+                max_attempts=None, timeout=None):
+        """
+        Постановка задачи в очередь.
+        Внутри транзакции задача станет видна обработчикам только
+        после ее фиксации.
+        """
+
+        return self.create(
+            name=name,
+            args=list(args),
+            kwargs=kwargs or {},
+            run_at=timezone.now() + timedelta(seconds=delay),
+            max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+            timeout=timeout or settings.JOBS_VISIBILITY_TIMEOUT,
+        )
+
+    def available(self, now):
+        """
+        Задачи, готовые к выполнению: ожидающие своего времени и взятые
+        обработчиком, который не уложился во время видимости.
+        """
+
+        return self.filter(
+            Q(status=Job.PENDING, run_at__lte=now)
+            | Q(status=Job.RUNNING, locked_until__lt=now,
+                attempts__lt=F('max_attempts'))
+        )
+
+    def expire(self, now):
+        """
+        Задачи, исчерпавшие попытки по таймауту, считаются упавшими.
+        """
+
+        return self.filter(
+            status=Job.RUNNING, locked_until__lt=now,
+            attempts__gte=F('max_attempts'),
+        ).update(
+            status=Job.FAILED,
+            finished_at=now,
+            error='Превышено время выполнения',
+        )
+
+    def purge(self, now):
+        """
+        Удаление выполненных задач старше JOBS_RETENTION_DAYS дней.
+        """
+
+        deleted, _ = self.filter(
+            status=Job.DONE,
+            finished_at__lt=now - timedelta(days=settings.JOBS_RETENTION_DAYS),
+        ).delete()
+        return deleted
+
+    def lock(self, worker, jobs, now):
+        claimed = []
+        for job in jobs:
+            locked_until = now + timedelta(seconds=job.timeout)
+            updated = self.filter(
+                id=job.id, status=job.status, attempts=job.attempts,
+            ).update(
+                status=Job.RUNNING,
+                worker=worker,
+                attempts=job.attempts + 1,
+                locked_until=locked_until,
+                started_at=now,
+            )
+            if updated:
+                job.status = Job.RUNNING
+                job.worker = worker
+                job.attempts += 1
+                job.locked_until = locked_until
+                job.started_at = now
+                claimed.append(job)
+        return claimed
+
+    def claim(self, worker, limit):
+        """
+        Захват до limit задач обработчиком worker.
+        На PostgreSQL строки блокируются через SELECT ... FOR UPDATE
+        SKIP LOCKED, и обработчики не видят чужих задач. SQLite этого
+        не умеет и блокирует всю базу, поэтому там задача захватывается
+        условным UPDATE вне транзакции: он срабатывает, только если
+        задачу никто не взял раньше.
+        """
+
+        now = timezone.now()
+        self.expire(now)
+        jobs = self.available(now).order_by('run_at', 'id')[:limit]
+        if not connections[self.db].features.has_select_for_update_skip_locked:
+            return self.lock(worker, list(jobs), now)
+        with transaction.atomic(using=self.db):
+            return self.lock(
+                worker, list(jobs.select_for_update(skip_locked=True)), now)
+
+    def finish(self, job, duration, error=''):
+        """
+        Сохранение результата задачи.
+        Упавшая задача возвращается в очередь с растущей задержкой, пока
+        не кончатся попытки. Результат не сохраняется, если задачу после
+        таймаута уже взял другой обработчик.
+        """
+
+        now = timezone.now()
+        status = Job.DONE
+        run_at = job.run_at
+        if error and job.attempts < job.max_attempts:
+            status = Job.PENDING
+            run_at = now + timedelta(
+                seconds=settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1))
+        elif error:
+            status = Job.FAILED
+        job.status = status
+        return self.filter(
+            id=job.id, worker=job.worker, status=Job.RUNNING,
+        ).update(
+            status=status,
+            run_at=run_at,
+            locked_until=None,
+            finished_at=now,
+            duration=duration,
+            error=error,
+        )
+
+
+class Job(models.Model):
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        max_length=200,
+        verbose_name='Задача',
+    )
+    args = models.JSONField(
+        default=list,
+        verbose_name='Аргументы',
+    )
+    kwargs = models.JSONField(
+        default=dict,
+        verbose_name='Именованные аргументы',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток',
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток',
+    )
+    timeout = models.PositiveIntegerField(
+        verbose_name='Время видимости, с',
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Выполнить после',
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Занята до',
+    )
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Обработчик',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания',
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Начало выполнения',
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Конец выполнения',
+    )
+    duration = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='Время выполнения, с',
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка',
+    )
+
+    objects = JobManager()
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=('status', 'run_at'),
+                name='job_status_run_at_idx',
+            ),
+            models.Index(
+                fields=('status', 'locked_until'),
+                name='job_status_locked_until_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.id}: {self.get_status_display()}'
+
+    @property
+    def wait(self):
+        """
+        Время от постановки в очередь до начала выполнения.
+        """
+
+        if self.started_at is None:
+            return None
+        return (self.started_at - self.created).total_seconds()
@@ -0,0 +1,41 @@
+from .models import Job
+
+TASKS = {}
+
+
+class Task:
+    """
+    Функция, которую можно выполнить в фоне через Task.enqueue().
+    """
+
+    def __init__(self, func, max_attempts=None, timeout=None):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__name__}'
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs):
+        return Job.objects.enqueue(
+            self.name, args, kwargs,
+            max_attempts=self.max_attempts,
+            timeout=self.timeout,
+        )
+
+
+def task(func=None, *, max_attempts=None, timeout=None):
+    """
+    Регистрация фоновой задачи.
+    Аргументы задачи должны сериализоваться в JSON.
+    """
+
+    def register(func):
+        registered = Task(func, max_attempts, timeout)
+        TASKS[registered.name] = registered
+        return registered
+
+    if func is None:
+        return register
+    return register(func)
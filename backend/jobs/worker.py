@@ -0,0 +1,90 @@
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .models import Job
+from .registry import TASKS
+
+
+class Worker:
+    """
+    Обработчик очереди: забирает задачи из таблицы и выполняет их
+    в пуле потоков.
+    """
+
+    def __init__(self, threads=1, poll_interval=None, once=False, log=print):
+        self.threads = threads
+        self.poll_interval = poll_interval or settings.JOBS_POLL_INTERVAL
+        self.once = once
+        self.log = log
+        self.name = f'{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}'
+        self.stopped = False
+        self.purged_at = None
+
+    def stop(self, *args):
+        self.stopped = True
+
+    def execute(self, job):
+        started = time.monotonic()
+        error = ''
+        try:
+            TASKS[job.name](*job.args, **job.kwargs)
+        except Exception:
+            error = traceback.format_exc()
+        duration = time.monotonic() - started
+        try:
+            Job.objects.finish(job, duration, error)
+        finally:
+            connection.close()
+        self.log(
+            f'{job.name} #{job.id}: {job.get_status_display()}, '
+            f'попытка {job.attempts}, выполнение {duration:.3f} с, '
+            f'ожидание {job.wait:.3f} с'
+        )
+        return job
+
+    def purge(self):
+        """
+        Удаление старых выполненных задач раз в JOBS_PURGE_INTERVAL секунд.
+        """
+
+        now = time.monotonic()
+        if (self.purged_at is not None
+                and now - self.purged_at < settings.JOBS_PURGE_INTERVAL):
+            return
+        self.purged_at = now
+        deleted = Job.objects.purge(timezone.now())
+        if deleted:
+            self.log(f'Удалено выполненных задач: {deleted}')
+
+    def run(self):
+        running = set()
+        with ThreadPoolExecutor(self.threads) as executor:
+            while not self.stopped:
+                close_old_connections()
+                self.purge()
+                running = {future for future in running if not future.done()}
+                free = self.threads - len(running)
+                jobs = Job.objects.claim(self.name, free) if free else []
+                for job in jobs:
+                    running.add(executor.submit(self.execute, job))
+                if not running:
+                    if self.once:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                if not jobs:
+                    wait(
+                        running,
+                        timeout=self.poll_interval,
+                        return_when=FIRST_COMPLETED,
+                    )
+            wait(running)
+        connection.close()
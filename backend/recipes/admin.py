@@ -1,7 +1,10 @@
 from django.contrib import admin
+from django.db.models import Count, Prefetch
 
-from .models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Subscribe, Tag)
+from .models import (FavoriteRecipe, Ingredient, PopularAuthor, Recipe,
+                     RecipeIngredient, ShoppingCart, ShoppingCartIngredient,
+                     Subscribe, Tag)
+from .paginations import EstimatedCountPaginator
 
 
 class RecipeIngredientAdmin(admin.StackedInline):
@@ -33,6 +36,26 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('pub_date', 'tags',)
     inlines = (RecipeIngredientAdmin,)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+
+    def save_related(self, request, form, formsets, change):
+        old_amounts = dict(form.instance.ingredient.values_list(
+            'ingredient_id', 'amount'))
+        super().save_related(request, form, formsets, change)
+        ShoppingCartIngredient.objects.update_recipe(
+            form.instance, old_amounts)
 
     @admin.display(description='Электронная почта автора')
     def get_author(self, obj):
@@ -46,15 +69,13 @@ class RecipeAdmin(admin.ModelAdmin):
     @admin.display(description=' Ингредиенты')
     def get_ingredients(self, obj):
         return '\n '.join([
-            f'{ingredient["ingredient__name"]} - {ingredient["amount"]}'
-            f' {ingredient["ingredient__measurement_unit"]}.'
-            for ingredient in obj.ingredient.values(
-                'ingredient__name',
-                'amount', 'ingredient__measurement_unit')])
+            f'{item.ingredient.name} - {item.amount}'
+            f' {item.ingredient.measurement_unit}.'
+            for item in obj.ingredient.all()])
 
     @admin.display(description='В избранном')
     def get_favorite_count(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
 
 
 @admin.register(Tag)
@@ -93,6 +114,17 @@ class SubscribeAdmin(admin.ModelAdmin):
     )
     search_fields = ('user__email', 'author__email',)
     empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(PopularAuthor)
+class PopularAuthorAdmin(admin.ModelAdmin):
+
+    list_display = ('author',)
+    search_fields = ('author__email',)
+    list_select_related = ('author',)
 
 
 @admin.register(FavoriteRecipe)
@@ -105,14 +137,25 @@ class FavoriteRecipeAdmin(admin.ModelAdmin):
         'get_count'
     )
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'user'
+        ).annotate(
+            recipes_count=Count('recipe')
+        ).prefetch_related(
+            Prefetch('recipe', queryset=Recipe.objects.only('name'))
+        )
 
     @admin.display(description='Рецепты')
     def get_recipe(self, obj):
-        return [f'{item["name"]} ' for item in obj.recipe.values('name')[:5]]
+        return [f'{item.name} ' for item in obj.recipe.all()[:5]]
 
     @admin.display(description='В избранных')
     def get_count(self, obj):
-        return obj.recipe.count()
+        return obj.recipes_count
 
 
 @admin.register(ShoppingCart)
@@ -125,11 +168,22 @@ class SoppingCartAdmin(admin.ModelAdmin):
         'get_count'
     )
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'user'
+        ).annotate(
+            recipes_count=Count('recipe')
+        ).prefetch_related(
+            Prefetch('recipe', queryset=Recipe.objects.only('name'))
+        )
 
     @admin.display(description='Рецепты')
     def get_recipe(self, obj):
-        return [f'{item["name"]} ' for item in obj.recipe.values('name')[:5]]
+        return [f'{item.name} ' for item in obj.recipe.all()[:5]]
 
     @admin.display(description='В избранных')
     def get_count(self, obj):
-        return obj.recipe.count()
+        return obj.recipes_count
@@ -0,0 +1,124 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOGUE_VERSION_KEY = 'recipes:catalogue-version'
+INGREDIENTS_VERSION_KEY = 'recipes:ingredients-version'
+TAGS_VERSION_KEY = 'recipes:tags-version'
+RECIPE_VERSION_KEY = 'recipes:recipe-version:{}'
+AUTHOR_VERSION_KEY = 'recipes:author-version:{}'
+FRAGMENT_KEY = 'recipes:fragment:v2:{host}:{id}:{versions}'
+
+USER_FIELDS = ('is_favorited', 'is_in_shopping_cart')
+AUTHOR_USER_FIELDS = ('is_subscribed',)
+
+
+def get_versions(keys):
+    """
+    Текущие номера версий для ключей.
+    Отсутствующая версия заводится заново от текущего времени,
+    чтобы не совпасть с версией фрагментов, сохраненных до ее вытеснения.
+    """
+
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return versions
+
+
+def bump_versions(keys):
+    """
+    Смена версий ключей.
+    Новая версия берется от текущего времени, а не через incr(),
+    который у файлового кэша сбрасывает время жизни ключа.
+    """
+
+    version = time.time_ns()
+    cache.set_many({key: version for key in keys}, timeout=None)
+
+
+def get_fragment_keys(recipes, request):
+    """
+    Ключи фрагментов рецептов.
+    Ключ меняется при изменении рецепта, его автора или справочников.
+    """
+
+    version_keys = [CATALOGUE_VERSION_KEY]
+    for recipe in recipes:
+        version_keys.append(RECIPE_VERSION_KEY.format(recipe.id))
+        version_keys.append(AUTHOR_VERSION_KEY.format(recipe.author_id))
+    versions = get_versions(version_keys)
+    catalogue_version = versions[CATALOGUE_VERSION_KEY]
+    return {
+        recipe.id: FRAGMENT_KEY.format(
+            host=request.get_host(),
+            id=recipe.id,
+            versions='{}.{}.{}'.format(
+                versions[RECIPE_VERSION_KEY.format(recipe.id)],
+                versions[AUTHOR_VERSION_KEY.format(recipe.author_id)],
+                catalogue_version,
+            ),
+        )
+        for recipe in recipes
+    }
+
+
+def get_fragments(keys):
+    """
+    Сохраненные фрагменты рецептов по их id.
+    """
+
+    fragments = cache.get_many(keys.values())
+    return {
+        recipe_id: fragments[key]
+        for recipe_id, key in keys.items()
+        if key in fragments
+    }
+
+
+def set_fragments(keys, data):
+    """
+    Сохранение общей для всех пользователей части рецептов.
+    Возвращает сохраненные фрагменты по id рецептов.
+    """
+
+    fragments = {}
+    for item in data:
+        fragment = {
+            field: value for field, value in item.items()
+            if field not in USER_FIELDS
+        }
+        fragment['author'] = {
+            field: value for field, value in item['author'].items()
+            if field not in AUTHOR_USER_FIELDS
+        }
+        fragments[item['id']] = fragment
+    cache.set_many(
+        {keys[recipe_id]: fragment
+         for recipe_id, fragment in fragments.items()},
+        timeout=settings.RECIPE_CACHE_TIMEOUT,
+    )
+    return fragments
+
+
+def invalidate_recipes(recipe_ids):
+    bump_versions(RECIPE_VERSION_KEY.format(id) for id in recipe_ids)
+
+
+def invalidate_authors(author_ids):
+    bump_versions(AUTHOR_VERSION_KEY.format(id) for id in author_ids)
+
+
+def invalidate_catalogue():
+    bump_versions([CATALOGUE_VERSION_KEY])
+
+
+def invalidate_tags():
+    bump_versions([CATALOGUE_VERSION_KEY, TAGS_VERSION_KEY])
+
+
+def invalidate_ingredients():
+    bump_versions([CATALOGUE_VERSION_KEY, INGREDIENTS_VERSION_KEY])
@@ -1,14 +1,39 @@
-from django_filters.rest_framework import (AllValuesMultipleFilter,
-                                           BooleanFilter, FilterSet)
+from django.db.models import Exists, OuterRef
+from django_filters.constants import EMPTY_VALUES
+from django_filters.rest_framework import (BooleanFilter, CharFilter,
+                                           FilterSet, MultipleChoiceFilter,
+                                           OrderingFilter)
 
+from .fulltext import search_recipes
 from .models import FavoriteRecipe, Recipe, ShoppingCart
+from .search import tag_index
+
+
+def get_tag_choices():
+    return tag_index.get_choices()
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """
+    Сортировка рецептов, при равенстве - по дате публикации.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        ordering = [self.get_ordering_value(param) for param in value]
+        return qs.order_by(*ordering, '-pub_date', '-id')
 
 
 class RecipeFilter(FilterSet):
 
     is_favorited = BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = BooleanFilter(method='get_is_in_shopping_cart')
-    tags = AllValuesMultipleFilter(field_name='tags__slug')
+    tags = MultipleChoiceFilter(
+        choices=get_tag_choices, method='get_tags')
+    search = CharFilter(method='get_search')
+    ordering = RecipeOrderingFilter(
+        fields=('pub_date', 'favorites_count', 'in_carts_count'))
 
     class Meta:
         model = Recipe
@@ -33,3 +58,11 @@ class RecipeFilter(FilterSet):
         return queryset.filter(
             id__in=(purchases)
         )
+
+    def get_tags(self, queryset, name, value):
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('id'), tag__in=tag_index.get_ids(value))
+        return queryset.filter(Exists(recipe_tags))
+
+    def get_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -0,0 +1,107 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField)
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+SEARCH_COLUMN = 'search_vector'
+FTS_TABLE = 'recipes_recipe_fts'
+
+SQLITE_INDEX = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, text, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        UPDATE {FTS_TABLE} SET name = new.name, text = new.text
+        WHERE rowid = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+)
+SQLITE_FILL = f"""
+    INSERT INTO {FTS_TABLE} (rowid, name, text)
+    SELECT id, name, text FROM recipes_recipe
+    WHERE id NOT IN (SELECT rowid FROM {FTS_TABLE})
+"""
+SQLITE_MATCH = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+SQLITE_RANK = (
+    f'(SELECT bm25({FTS_TABLE}, 2.0, 1.0) FROM {FTS_TABLE} '
+    f'WHERE {FTS_TABLE} MATCH %s AND rowid = recipes_recipe.id)'
+)
+
+
+def create_sqlite_index(connection):
+    """
+    Таблица FTS5 и триггеры, обновляющие ее при сохранении рецептов.
+    SQLite пересоздает таблицу рецептов при изменении ее схемы вместе
+    с триггерами, поэтому создание повторяется после каждой миграции.
+    """
+
+    with connection.cursor() as cursor:
+        for statement in SQLITE_INDEX:
+            cursor.execute(statement)
+        cursor.execute(SQLITE_FILL)
+
+
+def get_fts_query(value):
+    """
+    Запрос FTS5 из слов поисковой строки: все слова по началу.
+    """
+
+    words = value.replace('"', ' ').split()
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_postgresql(queryset, value):
+    query = SearchQuery(value, config=SEARCH_CONFIG, search_type='websearch')
+    vector = RawSQL(
+        f'{queryset.model._meta.db_table}.{SEARCH_COLUMN}', [],
+        output_field=SearchVectorField(),
+    )
+    return queryset.alias(search_vector=vector).filter(
+        search_vector=query,
+    ).annotate(
+        search_rank=SearchRank(F('search_vector'), query),
+    ).order_by('-search_rank', '-pub_date', '-id')
+
+
+def search_sqlite(queryset, value):
+    query = get_fts_query(value)
+    if not query:
+        return queryset
+    return queryset.filter(
+        id__in=RawSQL(SQLITE_MATCH, [query]),
+    ).annotate(
+        search_rank=RawSQL(SQLITE_RANK, [query]),
+    ).order_by('search_rank', '-pub_date', '-id')
+
+
+def search_recipes(queryset, value):
+    """
+    Полнотекстовый поиск рецептов по названию и описанию.
+    Совпадения в названии весят больше совпадений в описании.
+    """
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return search_postgresql(queryset, value)
+    if vendor == 'sqlite':
+        return search_sqlite(queryset, value)
+    return queryset.filter(Q(name__icontains=value) | Q(text__icontains=value))
@@ -0,0 +1,204 @@
+import json
+import math
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Subscribe, Tag
+from users.models import User
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+class QueryTimer:
+    """
+    Счетчик запросов к БД и их суммарного времени.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.count += 1
+
+
+class Command(BaseCommand):
+
+    help = 'Замер времени ответа и запросов к БД для эндпоинтов API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Количество замеров каждого эндпоинта',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=2,
+            help='Количество запросов перед замерами',
+        )
+        parser.add_argument(
+            '--user',
+            help='Email пользователя для запросов с авторизацией',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для результатов в JSON',
+        )
+
+    def get_user(self, email):
+        users = User.objects.filter(is_active=True)
+        if email:
+            users = users.filter(email=email)
+        user = users.order_by('id').first()
+        if user is None:
+            raise CommandError('Нет пользователя для запросов с авторизацией')
+        return user
+
+    def get_endpoints(self, user):
+        """
+        Эндпоинты из recipes/urls.py с параметрами из данных в базе.
+        Парные POST и DELETE оставляют данные такими же, какими они были.
+        """
+
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        if recipe is None or ingredient is None or not tags:
+            raise CommandError('Нужны рецепты, ингредиенты и теги в базе')
+        word = recipe.name.split()[0]
+        tags_query = '&'.join(f'tags={slug}' for slug in tags)
+        endpoints = [
+            ('GET', '/api/recipes/'),
+            ('GET', '/api/recipes/?page=2'),
+            ('GET', '/api/recipes/?limit=24'),
+            ('GET', '/api/recipes/?cursor='),
+            ('GET', '/api/recipes/feed/'),
+            ('GET', f'/api/recipes/?author={recipe.author_id}'),
+            ('GET', f'/api/recipes/?{tags_query}'),
+            ('GET', '/api/recipes/?is_favorited=1'),
+            ('GET', '/api/recipes/?is_in_shopping_cart=1'),
+            ('GET', f'/api/recipes/?search={word}'),
+            ('GET', '/api/recipes/?ordering=-favorites_count'),
+            ('GET', f'/api/recipes/{recipe.id}/'),
+            ('GET', '/api/recipes/download_shopping_cart/'),
+            ('GET', '/api/users/'),
+            ('GET', f'/api/users/{recipe.author_id}/'),
+            ('GET', '/api/users/me/'),
+            ('GET', '/api/users/subscriptions/?recipes_limit=3'),
+            ('GET', '/api/tags/'),
+            ('GET', f'/api/tags/{Tag.objects.get(slug=tags[0]).id}/'),
+            ('GET', f'/api/ingredients/?name={ingredient.name[:3]}'),
+            ('GET', f'/api/ingredients/{ingredient.id}/'),
+        ]
+        toggled = Recipe.objects.exclude(
+            favorite_recipe__user=user).exclude(
+            shopping_cart__user=user).order_by('-id').first()
+        if toggled is not None:
+            for action in ('favorite', 'shopping_cart'):
+                endpoints.append(
+                    ('POST', f'/api/recipes/{toggled.id}/{action}/'))
+                endpoints.append(
+                    ('DELETE', f'/api/recipes/{toggled.id}/{action}/'))
+        author = User.objects.exclude(id=user.id).exclude(
+            id__in=Subscribe.objects.filter(
+                user=user).values('author')).order_by('id').first()
+        if author is not None:
+            endpoints.append(('POST', f'/api/users/{author.id}/subscribe/'))
+            endpoints.append(('DELETE', f'/api/users/{author.id}/subscribe/'))
+        return endpoints
+
+    def request(self, client, method, path):
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            response = getattr(client, method.lower())(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, timer.count, timer.time
+
+    def measure(self, client, endpoints, repeat):
+        """
+        Замеры эндпоинтов по кругу, чтобы пары POST и DELETE чередовались.
+        """
+
+        samples = {endpoint: [] for endpoint in endpoints}
+        for _ in range(repeat):
+            for method, path in endpoints:
+                samples[method, path].append(
+                    self.request(client, method, path))
+        return samples
+
+    def summarize(self, user_type, endpoint, samples):
+        method, path = endpoint
+        statuses, times, queries, sql_times = zip(*samples)
+        result = {
+            'user': user_type,
+            'method': method,
+            'path': path,
+            'status': statistics.mode(statuses),
+        }
+        for percent in PERCENTILES:
+            result[f'p{percent}_ms'] = round(
+                percentile(times, percent) * 1000, 2)
+        result['queries'] = max(queries)
+        result['sql_ms'] = round(statistics.median(sql_times) * 1000, 2)
+        return result
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else ''
+        clients = {
+            'anonymous': Client(
+                raise_request_exception=False, HTTP_HOST=host),
+            'authenticated': Client(
+                raise_request_exception=False, HTTP_HOST=host,
+                HTTP_AUTHORIZATION=f'Token {token.key}'),
+        }
+        endpoints = self.get_endpoints(user)
+        results = []
+        for user_type, client in clients.items():
+            self.measure(client, endpoints, options['warmup'])
+            samples = self.measure(client, endpoints, options['repeat'])
+            results.extend(
+                self.summarize(user_type, endpoint, endpoint_samples)
+                for endpoint, endpoint_samples in samples.items()
+            )
+        for result in results:
+            self.stdout.write(
+                '{user:13} {status} {method:6} {path:45} '
+                'p50 {p50_ms:8.2f} p95 {p95_ms:8.2f} p99 {p99_ms:8.2f} мс '
+                'запросов {queries:3} SQL {sql_ms:7.2f} мс'.format(**result)
+            )
+        if options['output']:
+            report = {
+                'created': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'repeat': options['repeat'],
+                'user': user.email,
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS('Замеры закончены!'))
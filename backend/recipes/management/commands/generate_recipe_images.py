@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+from sorl.thumbnail import delete
+
+from recipes.models import Recipe
+from recipes.thumbnails import has_image_variants, update_image_variants
+
+
+class Command(BaseCommand):
+
+    help = 'Создание уменьшенных копий картинок рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии и у рецептов, где они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).only('id', 'image', 'image_variants')
+        updated = 0
+        for recipe in recipes.iterator():
+            if options['force']:
+                delete(recipe.image, delete_file=False)
+            if options['force'] or not has_image_variants(recipe):
+                update_image_variants(recipe)
+                updated += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Копии картинок созданы у {updated} рецептов!'))
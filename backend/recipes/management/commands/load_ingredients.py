@@ -3,6 +3,7 @@ import json
 from django.conf import settings
 from django.core.management import BaseCommand
 
+from recipes.cache import invalidate_ingredients
 from recipes.models import Ingredient
 
 
@@ -20,4 +21,5 @@ class Command(BaseCommand):
             data = json.load(file)
             Ingredient.objects.bulk_create(
                 Ingredient(**one_ingredient) for one_ingredient in data)
+        invalidate_ingredients()
         self.stdout.write(self.style.SUCCESS('Ингредиенты были загружены!'))
@@ -1,5 +1,6 @@
 from django.core.management import BaseCommand
 
+from recipes.cache import invalidate_tags
 from recipes.models import Tag
 
 
@@ -13,4 +14,5 @@ class Command(BaseCommand):
             {'name': 'Обед', 'color': '#FF0000', 'slug': 'dinner'},
             {'name': 'Ужин', 'color': '#00BFFF', 'slug': 'supper'}]
         Tag.objects.bulk_create(Tag(**tag) for tag in data)
+        invalidate_tags()
         self.stdout.write(self.style.SUCCESS('Все тэги загружены!'))
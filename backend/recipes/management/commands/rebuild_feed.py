@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from recipes.models import FeedItem, PopularAuthor
+
+
+class Command(BaseCommand):
+
+    help = 'Пересборка лент подписок по подпискам и рецептам'
+
+    def handle(self, *args, **options):
+        FeedItem.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны: {FeedItem.objects.count()} записей, '
+            f'популярных авторов {PopularAuthor.objects.count()}!'))
@@ -0,0 +1,64 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+
+    help = 'Пересчет сумм ингредиентов в корзинах покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить таблицу с пересчетом, не изменяя ее',
+        )
+
+    def get_differences(self):
+        expected = {
+            (row['recipe__shopping_cart__user'], row['ingredient']):
+                row['total']
+            for row in ShoppingCartIngredient.objects.calculate().iterator()
+        }
+        actual = dict(
+            ((user_id, ingredient_id), amount)
+            for user_id, ingredient_id, amount in (
+                ShoppingCartIngredient.objects.values_list(
+                    'user_id', 'ingredient_id', 'amount').iterator()
+            )
+        )
+        return {
+            key: (actual.get(key), expected.get(key))
+            for key in expected.keys() | actual.keys()
+            if actual.get(key) != expected.get(key)
+        }
+
+    def handle(self, *args, **options):
+        if options['check']:
+            differences = self.get_differences()
+            for (user_id, ingredient_id), (actual, expected) in sorted(
+                    differences.items()):
+                self.stdout.write(
+                    f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                    f'в таблице {actual}, должно быть {expected}'
+                )
+            if differences:
+                raise CommandError(
+                    f'Расхождений в корзинах: {len(differences)}')
+            self.stdout.write(self.style.SUCCESS('Корзины совпадают!'))
+            return
+        with transaction.atomic():
+            ShoppingCartIngredient.objects.all().delete()
+            ShoppingCartIngredient.objects.bulk_create(
+                (
+                    ShoppingCartIngredient(
+                        user_id=row['recipe__shopping_cart__user'],
+                        ingredient_id=row['ingredient'],
+                        amount=row['total'],
+                    )
+                    for row in ShoppingCartIngredient.objects.calculate()
+                ),
+                batch_size=1000,
+            )
+        self.stdout.write(self.style.SUCCESS('Корзины пересчитаны!'))
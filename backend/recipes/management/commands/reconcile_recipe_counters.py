@@ -0,0 +1,56 @@
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+
+
+def count_recipes(through):
+    return Coalesce(Subquery(
+        through.objects.filter(
+            recipe=OuterRef('id')
+        ).order_by().values('recipe').annotate(
+            total=Count('id')
+        ).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+
+    help = 'Пересчет счетчиков избранного и корзин у рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить счетчики, не изменяя их',
+        )
+
+    def handle(self, *args, **options):
+        counters = {
+            'favorites_count': count_recipes(FavoriteRecipe.recipe.through),
+            'in_carts_count': count_recipes(ShoppingCart.recipe.through),
+        }
+        if not options['check']:
+            updated = Recipe.objects.update(**counters)
+            self.stdout.write(self.style.SUCCESS(
+                f'Счетчики пересчитаны у {updated} рецептов!'))
+            return
+        wrong = Recipe.objects.annotate(
+            expected_favorites_count=counters['favorites_count'],
+            expected_in_carts_count=counters['in_carts_count'],
+        ).exclude(
+            Q(favorites_count=F('expected_favorites_count'))
+            & Q(in_carts_count=F('expected_in_carts_count'))
+        ).order_by('id')
+        for recipe in wrong:
+            self.stdout.write(
+                f'Рецепт {recipe.id}: '
+                f'избранное {recipe.favorites_count} '
+                f'вместо {recipe.expected_favorites_count}, '
+                f'корзины {recipe.in_carts_count} '
+                f'вместо {recipe.expected_in_carts_count}'
+            )
+        if wrong:
+            raise CommandError(f'Неверных счетчиков: {len(wrong)}')
+        self.stdout.write(self.style.SUCCESS('Счетчики совпадают!'))
@@ -0,0 +1,380 @@
+import io
+import multiprocessing
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+from random import Random
+
+from django.contrib.auth import hashers
+from django.core.management import BaseCommand, CommandError, call_command
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.cache import invalidate_catalogue
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Subscribe, Tag)
+from users.models import User
+
+SEED_PASSWORD = 'foodgram-seed'
+ZIPF_EXPONENT = 1.1
+PARETO_ALPHA = 1.5
+DATE_RANGE = timedelta(days=730)
+DISHES = (
+    'суп', 'борщ', 'салат', 'пирог', 'каша', 'омлет', 'рагу', 'плов',
+    'запеканка', 'паста', 'котлеты', 'блины', 'сырники', 'жаркое', 'торт',
+)
+ADJECTIVES = (
+    'домашний', 'быстрый', 'летний', 'острый', 'сливочный', 'овощной',
+    'бабушкин', 'праздничный', 'постный', 'сытный', 'легкий', 'пряный',
+)
+SENTENCES = (
+    'Нарежьте овощи небольшими кубиками.',
+    'Обжарьте на среднем огне до золотистого цвета.',
+    'Добавьте специи и перемешайте.',
+    'Накройте крышкой и тушите до готовности.',
+    'Подавайте горячим, посыпав зеленью.',
+    'Смешайте все ингредиенты в глубокой миске.',
+    'Выпекайте в разогретой духовке.',
+    'Дайте настояться несколько минут.',
+)
+
+samplers = {}
+
+
+def get_sampler(size):
+    """
+    Накопленные веса закона Ципфа: элемент с номером r выбирается
+    с вероятностью, пропорциональной 1 / r ** ZIPF_EXPONENT.
+    """
+
+    if size not in samplers:
+        samplers[size] = list(accumulate(
+            1 / rank ** ZIPF_EXPONENT for rank in range(1, size + 1)))
+    return samplers[size]
+
+
+def sample_zipf(rng, size, count, exclude=None):
+    """
+    До count разных номеров от 0 до size - 1, популярные чаще.
+    """
+
+    weights = get_sampler(size)
+    count = min(count, size - (exclude is not None))
+    chosen = set()
+    for _ in range(count * 10):
+        if len(chosen) >= count:
+            break
+        index = min(bisect(weights, rng.random() * weights[-1]), size - 1)
+        if index != exclude:
+            chosen.add(index)
+    return chosen
+
+
+def sample_count(rng, mean, limit):
+    """
+    Размер с распределением Парето и средним около mean.
+    """
+
+    scale = mean * (PARETO_ALPHA - 1) / PARETO_ALPHA
+    return min(int(scale * rng.paretovariate(PARETO_ALPHA)), limit)
+
+
+def random_date(rng, now):
+    return now - DATE_RANGE * rng.random()
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace(
+        '\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_objects(model, objects):
+    """
+    Загрузка объектов в PostgreSQL через COPY.
+    """
+
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not (field.primary_key and objects[0].pk is None)
+    ]
+    buffer = io.StringIO()
+    for obj in objects:
+        buffer.write('\t'.join(
+            copy_value(field.get_db_prep_save(
+                field.value_from_object(obj), connection))
+            for field in fields
+        ))
+        buffer.write('\n')
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN',
+            buffer,
+        )
+
+
+@contextmanager
+def explicit_dates(model):
+    """
+    bulk_create заменяет даты полей с auto_now_add на текущее время,
+    на время загрузки эти поля сохраняют заданные даты.
+    """
+
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def insert(model, objects):
+    """
+    Массовая вставка без сигналов post_save и m2m_changed.
+    """
+
+    if not objects:
+        return
+    if connection.vendor == 'postgresql':
+        copy_objects(model, objects)
+        return
+    with explicit_dates(model):
+        model.objects.bulk_create(objects)
+
+
+def seed_users(plan, start, count, rng, now):
+    users, favorites, carts = [], [], []
+    for index in range(start, start + count):
+        user_id = plan['user_start'] + index
+        date_joined = random_date(rng, now)
+        users.append(User(
+            id=user_id,
+            email=f'seed{user_id}@example.com',
+            username=f'seed{user_id}',
+            first_name=f'Имя{user_id}',
+            last_name=f'Фамилия{user_id}',
+            password=plan['password'],
+            date_joined=date_joined,
+        ))
+        favorites.append(FavoriteRecipe(
+            id=plan['favorite_start'] + index,
+            user_id=user_id, add_date=date_joined))
+        carts.append(ShoppingCart(
+            id=plan['cart_start'] + index,
+            user_id=user_id, add_date=date_joined))
+    insert(User, users)
+    insert(FavoriteRecipe, favorites)
+    insert(ShoppingCart, carts)
+    return len(users)
+
+
+def seed_recipes(plan, start, count, rng, now):
+    recipes, recipe_tags, recipe_ingredients = [], [], []
+    for index in range(start, start + count):
+        recipe_id = plan['recipe_start'] + index
+        author, = sample_zipf(rng, plan['users'], 1)
+        recipes.append(Recipe(
+            id=recipe_id,
+            author_id=plan['user_start'] + author,
+            name=f'{rng.choice(ADJECTIVES).capitalize()} '
+                 f'{rng.choice(DISHES)} №{recipe_id}',
+            text=' '.join(rng.choices(SENTENCES, k=rng.randint(2, 6))),
+            cooking_time=rng.randint(5, 180),
+            pub_date=random_date(rng, now),
+        ))
+        for tag_id in rng.sample(
+                plan['tags'], rng.randint(1, min(3, len(plan['tags'])))):
+            recipe_tags.append(
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id))
+        for ingredient_id in rng.sample(
+                plan['ingredients'],
+                min(rng.randint(5, 20), len(plan['ingredients']))):
+            recipe_ingredients.append(RecipeIngredient(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=rng.randint(1, 500)))
+    insert(Recipe, recipes)
+    insert(Recipe.tags.through, recipe_tags)
+    insert(RecipeIngredient, recipe_ingredients)
+    return len(recipes)
+
+
+def seed_links(plan, start, count, rng, now):
+    subscriptions, favorites, carts = [], [], []
+    for index in range(start, start + count):
+        user_id = plan['user_start'] + index
+        authors = sample_zipf(
+            rng, plan['users'],
+            sample_count(rng, plan['subscriptions'], plan['users'] // 2),
+            exclude=index,
+        )
+        subscriptions.extend(
+            Subscribe(
+                user_id=user_id, author_id=plan['user_start'] + author,
+                add_date=random_date(rng, now))
+            for author in authors
+        )
+        for objects, through, owner_field, owner_start, mean in (
+            (favorites, FavoriteRecipe.recipe.through, 'favoriterecipe_id',
+             plan['favorite_start'], plan['favorites']),
+            (carts, ShoppingCart.recipe.through, 'shoppingcart_id',
+             plan['cart_start'], plan['carts']),
+        ):
+            recipes = sample_zipf(
+                rng, plan['recipes'],
+                sample_count(rng, mean, plan['recipes'] // 2))
+            objects.extend(
+                through(**{
+                    owner_field: owner_start + index,
+                    'recipe_id': plan['recipe_start'] + recipe,
+                })
+                for recipe in recipes
+            )
+    insert(Subscribe, subscriptions)
+    insert(FavoriteRecipe.recipe.through, favorites)
+    insert(ShoppingCart.recipe.through, carts)
+    return count
+
+
+PHASES = {
+    'users': seed_users,
+    'recipes': seed_recipes,
+    'links': seed_links,
+}
+
+
+def seed_chunk(task):
+    phase, plan, start, count = task
+    rng = Random(f'{plan["seed"]}:{phase}:{start}')
+    with transaction.atomic():
+        return PHASES[phase](plan, start, count, rng, plan['now'])
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+class Command(BaseCommand):
+
+    help = 'Наполнение базы синтетическими данными для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Количество пользователей',
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Количество рецептов',
+        )
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Среднее количество подписок у пользователя',
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее количество избранных рецептов у пользователя',
+        )
+        parser.add_argument(
+            '--carts', type=float, default=5,
+            help='Среднее количество рецептов в корзине у пользователя',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество пользователей или рецептов в одной пачке',
+        )
+        parser.add_argument(
+            '--processes', type=int, default=multiprocessing.cpu_count(),
+            help='Количество процессов, для SQLite всегда один',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел',
+        )
+
+    def get_plan(self, options):
+        tags = list(Tag.objects.values_list('id', flat=True))
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        if not tags or not ingredients:
+            raise CommandError(
+                'Сначала загрузите теги и ингредиенты: '
+                'load_tags, load_ingredients')
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно хотя бы два пользователя и один рецепт')
+        return {
+            'seed': options['seed'],
+            'now': timezone.now(),
+            'password': hashers.make_password(SEED_PASSWORD),
+            'users': options['users'],
+            'recipes': options['recipes'],
+            'subscriptions': options['subscriptions'],
+            'favorites': options['favorites'],
+            'carts': options['carts'],
+            'tags': tags,
+            'ingredients': ingredients,
+            'user_start': next_id(User),
+            'favorite_start': next_id(FavoriteRecipe),
+            'cart_start': next_id(ShoppingCart),
+            'recipe_start': next_id(Recipe),
+        }
+
+    def run_phase(self, phase, plan, total, options):
+        batch_size = options['batch_size']
+        tasks = [
+            (phase, plan, start, min(batch_size, total - start))
+            for start in range(0, total, batch_size)
+        ]
+        processes = options['processes']
+        if connection.vendor == 'sqlite':
+            processes = 1
+        done = 0
+        if processes <= 1 or len(tasks) == 1:
+            results = map(seed_chunk, tasks)
+            for count in results:
+                done += count
+                self.stdout.write(f'{phase}: {done}/{total}')
+            return
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(min(processes, len(tasks))) as pool:
+            for count in pool.imap_unordered(seed_chunk, tasks):
+                done += count
+                self.stdout.write(f'{phase}: {done}/{total}')
+
+    def finish(self):
+        """
+        Пересчет того, что обычно поддерживают сигналы.
+        """
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                        no_style(),
+                        [User, FavoriteRecipe, ShoppingCart, Recipe]):
+                    cursor.execute(sql)
+                cursor.execute('ANALYZE')
+        call_command('reconcile_recipe_counters', stdout=self.stdout)
+        call_command('rebuild_shopping_cart', stdout=self.stdout)
+        call_command('rebuild_feed', stdout=self.stdout)
+        invalidate_catalogue()
+
+    def handle(self, *args, **options):
+        plan = self.get_plan(options)
+        self.run_phase('users', plan, plan['users'], options)
+        self.run_phase('recipes', plan, plan['recipes'], options)
+        self.run_phase('links', plan, plan['users'], options)
+        self.finish()
+        self.stdout.write(self.style.SUCCESS(
+            f'Созданы {plan["users"]} пользователей и '
+            f'{plan["recipes"]} рецептов, пароль {SEED_PASSWORD}!'))
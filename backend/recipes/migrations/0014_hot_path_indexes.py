@@ -0,0 +1,85 @@
+# Generated by Django 3.2.13 on 2026-10-18 03:28
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+THROUGH_INDEXES = (
+    ('favoriterecipe_recipe_reverse_idx',
+     'recipes_favoriterecipe_recipe', 'recipe_id, favoriterecipe_id'),
+    ('shoppingcart_recipe_reverse_idx',
+     'recipes_shoppingcart_recipe', 'recipe_id, shoppingcart_id'),
+)
+
+
+class AddIndex(AddIndexConcurrently):
+    """
+    Индекс, который на PostgreSQL строится CONCURRENTLY, без блокировки
+    записи в таблицу, а на остальных базах - обычным CREATE INDEX.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_forwards(
+            self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_backwards(
+            self, app_label, schema_editor, from_state, to_state)
+
+
+def create_through_indexes(apps, schema_editor):
+    concurrently = (
+        'CONCURRENTLY '
+        if schema_editor.connection.vendor == 'postgresql' else ''
+    )
+    for name, table, columns in THROUGH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX {concurrently}IF NOT EXISTS {name} '
+            f'ON {table} ({columns})'
+        )
+
+
+def drop_through_indexes(apps, schema_editor):
+    for name, _, _ in THROUGH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0013_recipe_search'),
+    ]
+
+    operations = [
+        AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_idx'),
+        ),
+        AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        AddIndex(
+            model_name='recipeingredient',
+            index=models.Index(fields=['recipe'], include=('ingredient', 'amount'), name='recipeingredient_recipe_idx'),
+        ),
+        AddIndex(
+            model_name='subscribe',
+            index=models.Index(fields=['user', '-id'], name='subscribe_user_idx'),
+        ),
+        AddIndex(
+            model_name='subscribe',
+            index=models.Index(fields=['author', 'user'], name='subscribe_author_user_idx'),
+        ),
+        migrations.RunPython(create_through_indexes, drop_through_indexes),
+    ]
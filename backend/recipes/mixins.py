@@ -1,3 +1,8 @@
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .cache import get_versions
 from .permissions import IsAdminOrReadOnly
 
 
@@ -10,14 +15,64 @@ class PermissionAndPaginationMixin:
     pagination_class = None
 
 
+class CatalogueVersionMixin:
+    """
+    Миксинкласс для вьюсетов справочников с условными GET-запросами.
+    ETag и Last-Modified строятся по версии справочника из кэша,
+    поэтому ответ 304 отдается без обращения к базе и сериализатору.
+    Ответ, построенный по индексу в памяти, передает версию индекса
+    через version: версия в кэше может быть новее данных индекса.
+    """
+
+    version_key = None
+
+    def get_conditional_headers(self, request, version=None):
+        if version is None:
+            version = get_versions([self.version_key])[self.version_key]
+        etag = quote_etag(f'{version}-{request.accepted_renderer.format}')
+        return etag, version // 10 ** 9
+
+    def conditional_response(self, handler, request, *args, version=None,
+                             **kwargs):
+        etag, last_modified = self.get_conditional_headers(request, version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(
+            response, public=True, must_revalidate=True,
+            max_age=settings.CATALOGUE_CACHE_MAX_AGE)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+
 class IsSubscribedMixin:
     """
     Миксинкласс для сериализаторов с полем подписки
     """
 
+    def get_subscribed_authors(self):
+        """
+        Множество id авторов, на которых подписан пользователь.
+        Загружается одним запросом и хранится в контексте сериализатора.
+        """
+
+        if 'subscribed_authors' not in self.context:
+            user = self.context['request'].user
+            self.context['subscribed_authors'] = (
+                set(user.follower.values_list('author_id', flat=True))
+                if user.is_authenticated else set()
+            )
+        return self.context['subscribed_authors']
+
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        user = request.user
-        return (user.is_authenticated
-                and user.follower.filter(author=obj).exists()
-                )
+        return obj.id in self.get_subscribed_authors()
@@ -1,6 +1,10 @@
+from itertools import islice
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
@@ -79,6 +83,11 @@ class Recipe(models.Model):
         blank=True,
         null=True,
     )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии картинки',
+        default=dict,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name='Описание рецепта',
         help_text='Опишите рецепт',
@@ -106,11 +115,35 @@ class Recipe(models.Model):
         verbose_name='Дата публикации рецепта',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=('-favorites_count', '-pub_date', '-id'),
+                name='recipe_favorites_count_idx',
+            ),
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name}: {self.text[:50]}...'
@@ -150,6 +183,13 @@ class RecipeIngredient(models.Model):
                 name='unique_ingredient'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('recipe',),
+                include=('ingredient', 'amount'),
+                name='recipeingredient_recipe_idx',
+            ),
+        ]
 
 
 class Subscribe(models.Model):
@@ -180,6 +220,16 @@ class Subscribe(models.Model):
                 fields=['user', 'author'],
                 name='unique_subscription')
         ]
+        indexes = [
+            models.Index(
+                fields=('user', '-id'),
+                name='subscribe_user_idx',
+            ),
+            models.Index(
+                fields=('author', 'user'),
+                name='subscribe_author_user_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
@@ -250,3 +300,310 @@ class ShoppingCart(models.Model):
             sender, instance, created, **kwargs):
         if created:
             return ShoppingCart.objects.create(user=instance)
+
+
+class ShoppingCartIngredientManager(models.Manager):
+
+    def add_amounts(self, user_ids, amounts):
+        """
+        Изменение сумм ингредиентов в корзинах пользователей.
+        amounts - словарь {id ингредиента: изменение количества},
+        строки с нулевой суммой удаляются.
+        """
+
+        user_ids = set(user_ids)
+        amounts = {id: amount for id, amount in amounts.items() if amount}
+        if not user_ids or not amounts:
+            return
+        rows = self.filter(user_id__in=user_ids, ingredient_id__in=amounts)
+        with transaction.atomic():
+            existing = set(rows.select_for_update().values_list(
+                'user_id', 'ingredient_id'))
+            rows.update(amount=F('amount') + Case(
+                *(When(ingredient_id=id, then=Value(amount))
+                  for id, amount in amounts.items()),
+                output_field=models.IntegerField(),
+            ))
+            self.bulk_create(
+                self.model(user_id=user_id, ingredient_id=id, amount=amount)
+                for user_id in user_ids
+                for id, amount in amounts.items()
+                if amount > 0 and (user_id, id) not in existing
+            )
+            rows.filter(amount__lte=0).delete()
+
+    def calculate(self):
+        """
+        Суммы ингредиентов в корзинах, посчитанные заново по рецептам.
+        """
+
+        return RecipeIngredient.objects.filter(
+            recipe__shopping_cart__user__isnull=False
+        ).values(
+            'recipe__shopping_cart__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by()
+
+    def add_recipes(self, user_ids, recipe_ids, sign=1):
+        amounts = {}
+        for id, amount in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', 'amount'):
+            amounts[id] = amounts.get(id, 0) + sign * amount
+        self.add_amounts(user_ids, amounts)
+
+    def remove_recipes(self, user_ids, recipe_ids):
+        self.add_recipes(user_ids, recipe_ids, sign=-1)
+
+    def update_recipe(self, recipe, old_amounts):
+        """
+        Пересчет корзин, в которых лежит рецепт с измененными ингредиентами.
+        old_amounts - словарь {id ингредиента: количество} до изменения.
+        """
+
+        amounts = {id: -amount for id, amount in old_amounts.items()}
+        for id, amount in recipe.ingredient.values_list(
+                'ingredient_id', 'amount'):
+            amounts[id] = amounts.get(id, 0) + amount
+        self.add_amounts(
+            recipe.shopping_cart.values_list('user_id', flat=True), amounts)
+
+
+class ShoppingCartIngredient(models.Model):
+
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        to=Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество ингредиента',
+        default=0,
+    )
+
+    objects = ShoppingCartIngredientManager()
+
+    class Meta:
+        verbose_name = 'Сумма ингредиента в корзине'
+        verbose_name_plural = 'Суммы ингредиентов в корзине'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_cart_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'У {self.user} {self.ingredient}: {self.amount}'
+
+
+class PopularAuthor(models.Model):
+    """
+    Автор, у которого больше FEED_FANOUT_LIMIT подписчиков.
+    Его рецепты не раскладываются по лентам, а добавляются при чтении.
+    """
+
+    author = models.OneToOneField(
+        to=User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popular_author',
+        verbose_name='Автор',
+    )
+
+    class Meta:
+        verbose_name = 'Популярный автор'
+        verbose_name_plural = 'Популярные авторы'
+
+    def __str__(self):
+        return f'{self.author}'
+
+
+class FeedItemManager(models.Manager):
+
+    batch_size = 1000
+
+    def is_popular(self, author_id):
+        """
+        Проверка, что у автора слишком много подписчиков для рассылки.
+        Однажды отмеченный автор остается популярным до пересборки лент,
+        иначе рецепты, которые не разослали, пропали бы из лент.
+        """
+
+        if PopularAuthor.objects.filter(author_id=author_id).exists():
+            return True
+        if not Subscribe.objects.filter(
+                author_id=author_id)[settings.FEED_FANOUT_LIMIT:].exists():
+            return False
+        PopularAuthor.objects.get_or_create(author_id=author_id)
+        return True
+
+    def insert(self, rows):
+        """
+        Вставка строк ленты пачками по batch_size: bulk_create сразу
+        превращает переданные объекты в список, поэтому строки из
+        iterator() отдаются ему частями.
+        """
+
+        rows = iter(rows)
+        while True:
+            batch = [
+                self.model(
+                    user_id=user_id, recipe_id=recipe_id,
+                    author_id=author_id, pub_date=pub_date,
+                )
+                for user_id, recipe_id, author_id, pub_date in islice(
+                    rows, self.batch_size)
+            ]
+            if not batch:
+                return
+            self.bulk_create(batch, ignore_conflicts=True)
+
+    def fan_out(self, recipe):
+        """
+        Рассылка нового рецепта в ленты подписчиков автора.
+        """
+
+        if self.is_popular(recipe.author_id):
+            return
+        self.insert(
+            (user_id, recipe.id, recipe.author_id, recipe.pub_date)
+            for user_id in Subscribe.objects.filter(
+                author_id=recipe.author_id
+            ).values_list('user_id', flat=True).iterator()
+        )
+
+    def subscribe(self, user_id, author_id):
+        """
+        Рецепты автора в ленте нового подписчика.
+        """
+
+        if self.is_popular(author_id):
+            return
+        self.insert(
+            (user_id, recipe_id, author_id, pub_date)
+            for recipe_id, pub_date in Recipe.objects.filter(
+                author_id=author_id
+            ).values_list('id', 'pub_date').iterator()
+        )
+
+    def unsubscribe(self, user_id, author_id):
+        self.filter(user_id=user_id, author_id=author_id).delete()
+
+    def rebuild(self):
+        """
+        Пересборка лент и списка популярных авторов по подпискам.
+        """
+
+        with transaction.atomic():
+            self.all().delete()
+            PopularAuthor.objects.all().delete()
+            PopularAuthor.objects.bulk_create(
+                (
+                    PopularAuthor(author_id=row['author'])
+                    for row in Subscribe.objects.values('author').annotate(
+                        followers=Count('id')
+                    ).filter(
+                        followers__gt=settings.FEED_FANOUT_LIMIT
+                    ).order_by()
+                ),
+                batch_size=self.batch_size,
+            )
+            self.insert(
+                Recipe.objects.filter(
+                    author__following__isnull=False,
+                    author__popular_author__isnull=True,
+                ).values_list(
+                    'author__following__user', 'id', 'author', 'pub_date',
+                ).order_by().iterator()
+            )
+
+    def after(self, queryset, position, id_field):
+        if position is None:
+            return queryset
+        pub_date, id = position
+        return queryset.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, **{f'{id_field}__lt': id})
+        )
+
+    def get_keys(self, user, position, limit):
+        """
+        Ключи (pub_date, id) рецептов ленты пользователя после position.
+        Разосланные рецепты берутся из таблицы ленты, рецепты популярных
+        авторов - из их рецептов, две выборки сливаются по ключу.
+        Рецепт автора, ставшего популярным, может найтись в обеих.
+        """
+
+        fanned_out = self.after(
+            self.filter(user=user), position, 'recipe_id'
+        ).order_by('-pub_date', '-recipe_id').values_list(
+            'pub_date', 'recipe_id')
+        merged = self.after(
+            Recipe.objects.filter(
+                author__in=PopularAuthor.objects.filter(
+                    author__following__user=user).values('author')
+            ),
+            position, 'id',
+        ).order_by('-pub_date', '-id').values_list('pub_date', 'id')
+        keys = set(fanned_out[:limit]) | set(merged[:limit])
+        return sorted(keys, reverse=True)[:limit]
+
+
+class FeedItem(models.Model):
+    """
+    Рецепт в ленте подписок пользователя.
+    """
+
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта',
+    )
+
+    objects = FeedItemManager()
+
+    class Meta:
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Рецепты в лентах'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_item',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feeditem_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='feeditem_user_author_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
@@ -1,7 +1,141 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для админки.
+    Для больших таблиц без фильтров PostgreSQL количество строк берется
+    из статистики планировщика вместо полного COUNT(*).
+    """
+
+    large_table_rows = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > self.large_table_rows:
+                return int(row[0])
+        return super().count
 
 
 class LimitPageNumberPagination(PageNumberPagination):
 
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class RecipePagination(LimitPageNumberPagination):
+    """
+    Пагинация рецептов.
+    С параметром cursor рецепты выдаются по ключу (pub_date, id)
+    без подсчета общего количества и сдвига OFFSET.
+    Без него, а также вместе с page или ordering,
+    работает постраничная выдача.
+    """
+
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    cursor_ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор'
+
+    def use_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            and self.page_query_param not in request.query_params
+            and self.ordering_query_param not in request.query_params
+        )
+
+    def encode_cursor(self, pub_date, id):
+        position = f'{pub_date.isoformat()}|{id}'
+        return urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, id = urlsafe_b64decode(
+                encoded.encode()).decode().split('|')
+            return datetime.fromisoformat(pub_date), int(id)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.use_cursor(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.cursor_ordering)
+        cursor = self.decode_cursor(request)
+        if cursor:
+            pub_date, id = cursor
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=id)
+            )
+        recipes = list(queryset[:page_size + 1])
+        self.next_cursor = (
+            self.encode_cursor(
+                recipes[page_size - 1].pub_date, recipes[page_size - 1].id)
+            if len(recipes) > page_size else None
+        )
+        return recipes[:page_size]
+
+    def get_next_cursor_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor,
+        )
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_cursor_link()),
+            ('results', data),
+        ]))
+
+
+class FeedPagination(RecipePagination):
+    """
+    Пагинация ленты подписок, всегда по ключу (pub_date, id).
+    """
+
+    def paginate_keys(self, get_keys, request):
+        """
+        Id рецептов страницы.
+        get_keys(position, limit) - до limit ключей (pub_date, id)
+        после position по убыванию.
+        """
+
+        self.cursor_mode = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        keys = get_keys(self.decode_cursor(request), page_size + 1)
+        self.next_cursor = (
+            self.encode_cursor(*keys[page_size - 1])
+            if len(keys) > page_size else None
+        )
+        return [id for _, id in keys[:page_size]]
@@ -0,0 +1,78 @@
+from collections import defaultdict
+
+from .models import Recipe, RecipeIngredient
+from .thumbnails import get_image_urls
+from users.models import User
+
+AUTHOR_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+
+
+def get_authors(author_ids):
+    return {
+        row[1]: dict(zip(AUTHOR_FIELDS, row))
+        for row in User.objects.filter(
+            id__in=author_ids).values_list(*AUTHOR_FIELDS)
+    }
+
+
+def get_tags(recipe_ids):
+    """
+    Теги рецептов в порядке Tag.Meta.ordering.
+    """
+
+    tags = defaultdict(list)
+    for recipe_id, *values in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('-tag_id').values_list(
+        'recipe_id', *(f'tag__{field}' for field in TAG_FIELDS)
+    ):
+        tags[recipe_id].append(dict(zip(TAG_FIELDS, values)))
+    return tags
+
+
+def get_ingredients(recipe_ids):
+    """
+    Ингредиенты рецептов с количеством в порядке RecipeIngredient.Meta.
+    """
+
+    ingredients = defaultdict(list)
+    for recipe_id, *values in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list(
+        'recipe_id',
+        *(f'ingredient__{field}' for field in INGREDIENT_FIELDS),
+        'amount',
+    ):
+        ingredients[recipe_id].append(
+            dict(zip((*INGREDIENT_FIELDS, 'amount'), values)))
+    return ingredients
+
+
+def build_recipe_fragments(recipes, request):
+    """
+    Общая для всех пользователей часть рецептов в том же виде, что дает
+    RecipeReadSerializer без полей пользователя, но без сериализаторов:
+    автор, теги и ингредиенты берутся тремя запросами values_list.
+    """
+
+    recipe_ids = [recipe.id for recipe in recipes]
+    authors = get_authors({recipe.author_id for recipe in recipes})
+    tags = get_tags(recipe_ids)
+    ingredients = get_ingredients(recipe_ids)
+    fragments = []
+    for recipe in recipes:
+        images = get_image_urls(recipe, request)
+        fragments.append({
+            'id': recipe.id,
+            'tags': tags[recipe.id],
+            'author': authors[recipe.author_id],
+            'ingredients': ingredients[recipe.id],
+            'name': recipe.name,
+            'image': images.get('card', {}).get('url'),
+            'images': images,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        })
+    return fragments
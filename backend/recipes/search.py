@@ -0,0 +1,210 @@
+import re
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from threading import Lock
+
+from django.conf import settings
+
+from .cache import INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY, get_versions
+from .models import Ingredient, Tag
+
+WORD_SPLIT = re.compile(r'[^\w]+')
+NGRAM_SIZE = 3
+FUZZY_THRESHOLD = 0.5
+
+IngredientSnapshot = namedtuple(
+    'IngredientSnapshot',
+    ('items', 'names', 'words', 'word_keys', 'ngrams', 'ngram_counts'),
+)
+
+
+def normalize(text):
+    """
+    Приведение строки к виду для поиска: без регистра, ё -> е,
+    одиночные пробелы между словами.
+    """
+
+    return ' '.join(text.casefold().replace('ё', 'е').split())
+
+
+def get_ngrams(text):
+    padded = f' {text} '
+    return {
+        padded[i:i + NGRAM_SIZE]
+        for i in range(len(padded) - NGRAM_SIZE + 1)
+    }
+
+
+def prefix_range(keys, prefix):
+    return range(
+        bisect_left(keys, prefix),
+        bisect_left(keys, prefix + '\uffff'),
+    )
+
+
+class VersionedIndex(ABC):
+    """
+    Справочник в памяти процесса.
+    Строится при первом обращении и перестраивается после смены версии
+    справочника в кэше.
+    """
+
+    version_key = None
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.checked_at = 0
+
+    @abstractmethod
+    def build(self):
+        """
+        Построение индекса из БД.
+        """
+
+    def refresh(self):
+        now = time.monotonic()
+        if now - self.checked_at < settings.CATALOGUE_INDEX_CHECK_INTERVAL:
+            return
+        version = get_versions([self.version_key])[self.version_key]
+        with self.lock:
+            if version != self.version:
+                self.build()
+                self.version = version
+            self.checked_at = now
+
+
+class TagIndex(VersionedIndex):
+    """
+    Теги по слагам.
+    """
+
+    version_key = TAGS_VERSION_KEY
+
+    def build(self):
+        self.ids = dict(Tag.objects.values_list('slug', 'id'))
+
+    def get_choices(self):
+        self.refresh()
+        return [(slug, slug) for slug in self.ids]
+
+    def get_ids(self, slugs):
+        self.refresh()
+        return [self.ids[slug] for slug in slugs if slug in self.ids]
+
+
+class IngredientIndex(VersionedIndex):
+    """
+    Индекс ингредиентов в памяти процесса.
+    Перестраивается после изменения справочника ингредиентов.
+    Результаты ранжируются так: совпадение с началом названия,
+    с началом слова, подстрока, похожее написание.
+    Все структуры индекса публикуются одним присваиванием snapshot,
+    поэтому поиск без блокировки не смешивает старый и новый индекс.
+    """
+
+    version_key = INGREDIENTS_VERSION_KEY
+
+    def build(self):
+        ingredients = Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit')
+        items = sorted(
+            (normalize(name), id, name, measurement_unit)
+            for id, name, measurement_unit in ingredients
+        )
+        words = []
+        ngrams = defaultdict(set)
+        ngram_counts = []
+        for position, (name, *_) in enumerate(items):
+            for word in WORD_SPLIT.split(name)[1:]:
+                if word:
+                    words.append((word, position))
+            name_ngrams = get_ngrams(name)
+            for ngram in name_ngrams:
+                ngrams[ngram].add(position)
+            ngram_counts.append(len(name_ngrams))
+        words.sort()
+        self.snapshot = IngredientSnapshot(
+            items=items,
+            names=[item[0] for item in items],
+            words=words,
+            word_keys=[word for word, _ in words],
+            ngrams=dict(ngrams),
+            ngram_counts=ngram_counts,
+        )
+
+    @staticmethod
+    def find_prefixes(snapshot, query):
+        return prefix_range(snapshot.names, query)
+
+    @staticmethod
+    def find_word_prefixes(snapshot, query):
+        for index in prefix_range(snapshot.word_keys, query):
+            yield snapshot.words[index][1]
+
+    @staticmethod
+    def find_substrings(snapshot, query):
+        if len(query) < NGRAM_SIZE:
+            return []
+        candidates = set.intersection(*(
+            snapshot.ngrams.get(query[i:i + NGRAM_SIZE], set())
+            for i in range(len(query) - NGRAM_SIZE + 1)
+        ))
+        return sorted(
+            position for position in candidates
+            if query in snapshot.names[position]
+        )
+
+    @staticmethod
+    def find_similar(snapshot, query):
+        if len(query) < NGRAM_SIZE:
+            return []
+        ngrams = get_ngrams(query)
+        scores = defaultdict(int)
+        for ngram in ngrams:
+            for position in snapshot.ngrams.get(ngram, ()):
+                scores[position] += 1
+        similar = []
+        for position, common in scores.items():
+            similarity = common / len(ngrams)
+            if similarity >= FUZZY_THRESHOLD:
+                similar.append(
+                    (-similarity, snapshot.ngram_counts[position], position))
+        return [position for *_, position in sorted(similar)]
+
+    def search(self, query, limit=None):
+        """
+        Поиск ингредиентов по части названия.
+        Возвращает не больше limit словарей с полями ингредиента.
+        """
+
+        self.refresh()
+        snapshot = self.snapshot
+        query = normalize(query)
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        found = {}
+        finders = (
+            self.find_prefixes, self.find_word_prefixes,
+            self.find_substrings, self.find_similar,
+        )
+        for find in finders:
+            for position in find(snapshot, query):
+                found.setdefault(position, None)
+                if len(found) >= limit:
+                    break
+            if len(found) >= limit:
+                break
+        return [
+            {
+                'id': snapshot.items[position][1],
+                'name': snapshot.items[position][2],
+                'measurement_unit': snapshot.items[position][3],
+            }
+            for position in found
+        ]
+
+
+ingredient_index = IngredientIndex()
+tag_index = TagIndex()
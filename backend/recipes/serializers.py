@@ -1,13 +1,38 @@
+from django.conf import settings
 from django.contrib.auth import authenticate, hashers, password_validation
+from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
+from .cache import get_fragment_keys, get_fragments, set_fragments
 from .mixins import IsSubscribedMixin
-from .models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Subscribe, Tag)
+from .models import (Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCartIngredient, Subscribe, Tag)
+from .representations import build_recipe_fragments
+from .thumbnails import get_image_urls
 from users.models import User
 
 
+class RecipeImageField(serializers.ReadOnlyField):
+    """
+    Ссылки на уменьшенные копии картинки рецепта.
+    С size отдается ссылка на JPEG этого размера, без него - ссылки
+    на JPEG и WebP всех размеров.
+    """
+
+    def __init__(self, size=None, **kwargs):
+        self.size = size
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        images = get_image_urls(recipe, self.context.get('request'))
+        if self.size is None:
+            return images
+        return images.get(self.size, {}).get('url')
+
+
 class TagSerializer(serializers.ModelSerializer):
     """
     Сериализатор для тегов.
@@ -35,7 +60,8 @@ class UserListSerializer(IsSubscribedMixin, serializers.ModelSerializer):
     Сериализатор для вывода списка пользователей.
     """
 
-    is_subscribed = serializers.BooleanField(read_only=True)
+    is_subscribed = serializers.SerializerMethodField(
+        read_only=True)
 
     class Meta:
         model = User
@@ -65,12 +91,14 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
     Сериализатор для короткого содержимого рецепта в подписках.
     """
 
+    image = RecipeImageField(size='card')
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(IsSubscribedMixin, serializers.ModelSerializer):
     """
     Сериализатор для подписок.
     """
@@ -101,16 +129,20 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         )
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.author.recipe.count()
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        user = request.user
-        if not user.is_authenticated:
-            return False
-        return user.follower.filter(author=obj.author).exists()
+        if obj.user_id == self.context['request'].user.id:
+            return True
+        return obj.author_id in self.get_subscribed_authors()
 
     def get_recipes(self, obj):
+        if hasattr(obj.author, 'recipes_preview'):
+            return ShortRecipeSerializer(
+                obj.author.recipes_preview,
+                many=True).data
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
         recipes = (
@@ -152,7 +184,7 @@ class UserSetPasswordSerializer(serializers.Serializer):
         new_password = validated_data.get('new_password')
         password = hashers.make_password(new_password)
         user.password = password
-        user.save()
+        user.save(update_fields=('password',))
         return validated_data
 
 
@@ -202,6 +234,55 @@ class AuthorSerializer(IsSubscribedMixin, serializers.ModelSerializer):
             'first_name', 'last_name', 'is_subscribed')
 
 
+class RecipeListSerializer(IsSubscribedMixin, serializers.ListSerializer):
+    """
+    Сериализатор списка рецептов с кэшированием их общей части.
+    Поля, зависящие от пользователя, добавляются при каждом ответе.
+    Размер картинки в поле image задается в контексте через image_size.
+    С RECIPE_FAST_READ фрагменты собираются из строк БД без вложенных
+    сериализаторов, вид ответа при этом тот же.
+    """
+
+    prefetch = (
+        'author',
+        Prefetch('tags', queryset=Tag.objects.all()),
+        Prefetch(
+            'ingredient',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ),
+    )
+
+    def build(self, recipes):
+        if settings.RECIPE_FAST_READ:
+            return build_recipe_fragments(recipes, self.context['request'])
+        prefetch_related_objects(recipes, *self.prefetch)
+        return super().to_representation(recipes)
+
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        keys = get_fragment_keys(recipes, self.context['request'])
+        fragments = get_fragments(keys)
+        missed = [recipe for recipe in recipes if recipe.id not in fragments]
+        if missed:
+            fragments.update(set_fragments(keys, self.build(missed)))
+        subscribed_authors = self.get_subscribed_authors()
+        image_size = self.context.get('image_size', 'card')
+        return [
+            {
+                **fragments[recipe.id],
+                'image': fragments[recipe.id]['images'].get(
+                    image_size, {}).get('url'),
+                'author': {
+                    **fragments[recipe.id]['author'],
+                    'is_subscribed': recipe.author_id in subscribed_authors,
+                },
+                'is_favorited': recipe.is_favorited,
+                'is_in_shopping_cart': recipe.is_in_shopping_cart,
+            }
+            for recipe in recipes
+        ]
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
     """
     Сериализатор для чтения рецептов.
@@ -216,11 +297,12 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         read_only=True,
         many=True
     )
-    image = Base64ImageField()
-    is_favorited = serializers.SerializerMethodField(
+    image = RecipeImageField(size='card')
+    images = RecipeImageField()
+    is_favorited = serializers.BooleanField(
         read_only=True
     )
-    is_in_shopping_cart = serializers.SerializerMethodField(
+    is_in_shopping_cart = serializers.BooleanField(
         read_only=True
     )
     author = AuthorSerializer(
@@ -231,21 +313,10 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients',
-            'name', 'image', 'text', 'cooking_time',
+            'name', 'image', 'images', 'text', 'cooking_time',
             'is_favorited', 'is_in_shopping_cart',
         )
-
-    def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        if not user.is_authenticated:
-            return False
-        return FavoriteRecipe.objects.filter(recipe=obj, user=user).exists()
-
-    def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if not user.is_authenticated:
-            return False
-        return ShoppingCart.objects.filter(recipe=obj, user=user).exists()
+        list_serializer_class = RecipeListSerializer
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
@@ -256,13 +327,13 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     ingredients = AmountOfIngredientsWriteSerializer(
         many=True,
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
+    tags = serializers.ListField(
+        child=serializers.IntegerField()
     )
     image = Base64ImageField(
         max_length=None,
         use_url=True)
+    saved_fields = ('name', 'image', 'text', 'cooking_time')
 
     class Meta:
         model = Recipe
@@ -276,13 +347,14 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Должен быть хотя бы один тэг для рецепте!'
             )
-        for tag in tags:
-            id = tag.id
-            if not Tag.objects.filter(id=id).exists():
+        existing = set(
+            Tag.objects.filter(id__in=tags).values_list('id', flat=True))
+        for id in tags:
+            if id not in existing:
                 raise serializers.ValidationError(
                     f'Тэга c ID: -> {id} не существует!'
                 )
-        return tags
+        return list(dict.fromkeys(tags))
 
     def validate_cooking_time(self, cooking_time):
         if int(cooking_time) < 1:
@@ -294,17 +366,20 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         if not ingredients:
             raise serializers.ValidationError(
                 'Должен быть хотя бы один ингредиент в рецепте!')
-        ingredient_list = []
+        existing = set(Ingredient.objects.filter(
+            id__in=[ingredient['id'] for ingredient in ingredients]
+        ).values_list('id', flat=True))
+        seen = set()
         for ingredient in ingredients:
             id = ingredient['id']
-            if not Ingredient.objects.filter(id=id).exists():
+            if id not in existing:
                 raise serializers.ValidationError(
                     f'Ингредиента c ID: -> {id} не существует!'
                 )
-            if ingredient in ingredient_list:
+            if id in seen:
                 raise serializers.ValidationError(
                     'Ингредиент в рецепте должен быть уникальным!')
-            ingredient_list.append(ingredient)
+            seen.add(id)
             amount = int(ingredient.get('amount'))
             if amount < 1:
                 raise serializers.ValidationError(
@@ -312,14 +387,16 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return ingredients
 
     def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            id = ingredient.get('id')
-            amount = ingredient.get('amount')
-            RecipeIngredient.objects.create(
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
                 recipe=recipe,
-                ingredient_id=id,
-                amount=amount, )
+                ingredient_id=ingredient.get('id'),
+                amount=ingredient.get('amount'),
+            )
+            for ingredient in ingredients
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -328,13 +405,20 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         self.create_ingredients(ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if 'ingredients' in validated_data:
             ingredients = validated_data.pop('ingredients')
+            old_amounts = dict(
+                instance.ingredient.values_list('ingredient_id', 'amount'))
             instance.ingredients.clear()
             self.create_ingredients(ingredients, instance)
+            ShoppingCartIngredient.objects.update_recipe(
+                instance, old_amounts)
         if 'tags' in validated_data:
             tags = validated_data.pop('tags')
-            instance.ingredients.clear()
             instance.tags.set(tags)
-        return super().update(instance, validated_data)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=self.saved_fields)
+        return instance
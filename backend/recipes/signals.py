@@ -0,0 +1,175 @@
+from functools import partial
+
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_migrate,
+                                      post_save, pre_delete)
+from django.dispatch import receiver
+
+from .cache import (invalidate_authors, invalidate_catalogue,
+                    invalidate_ingredients, invalidate_recipes,
+                    invalidate_tags)
+from .fulltext import FTS_TABLE, create_sqlite_index
+from .models import (FavoriteRecipe, FeedItem, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, ShoppingCartIngredient,
+                     Subscribe, Tag)
+from .tasks import fan_out_recipe, generate_image_variants
+from .thumbnails import has_image_variants
+from users.models import User
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+RECIPE_COUNTERS = {
+    FavoriteRecipe.recipe.through: ('favorites_count', 'favorite_recipe'),
+    ShoppingCart.recipe.through: ('in_carts_count', 'shopping_cart'),
+}
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_recipes, [instance.id]))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    if not has_image_variants(instance):
+        generate_image_variants.enqueue(instance.id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        fan_out_recipe.enqueue(instance.id)
+
+
+@receiver(post_save, sender=Subscribe)
+def subscribe_created(sender, instance, created, **kwargs):
+    if created:
+        FeedItem.objects.subscribe(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def subscribe_deleted(sender, instance, **kwargs):
+    FeedItem.objects.unsubscribe(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_recipes, [instance.recipe_id]))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        transaction.on_commit(invalidate_catalogue)
+    else:
+        transaction.on_commit(partial(invalidate_recipes, [instance.id]))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_tags)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_ingredients)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not AUTHOR_FIELDS.intersection(update_fields):
+        return
+    transaction.on_commit(partial(invalidate_authors, [instance.id]))
+
+
+@receiver(m2m_changed, sender=ShoppingCart.recipe.through)
+def shopping_cart_changed(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+    if reverse:
+        carts = ShoppingCart.objects.all()
+        if action != 'post_add':
+            carts = carts.filter(recipe=instance)
+        if action != 'pre_clear':
+            carts = carts.filter(id__in=pk_set)
+        user_ids = carts.values_list('user_id', flat=True)
+        recipe_ids = [instance.id]
+    else:
+        recipes = Recipe.objects.all()
+        if action != 'post_add':
+            recipes = instance.recipe.all()
+        if action != 'pre_clear':
+            recipes = recipes.filter(id__in=pk_set)
+        user_ids = [instance.user_id]
+        recipe_ids = recipes.values_list('id', flat=True)
+    if action == 'post_add':
+        ShoppingCartIngredient.objects.add_recipes(user_ids, recipe_ids)
+    else:
+        ShoppingCartIngredient.objects.remove_recipes(user_ids, recipe_ids)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    ShoppingCartIngredient.objects.remove_recipes(
+        instance.shopping_cart.values_list('user_id', flat=True),
+        [instance.id],
+    )
+
+
+def change_recipe_counter(field, recipe_ids, delta):
+    recipe_ids = list(recipe_ids)
+    if recipe_ids and delta:
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            **{field: F(field) + delta})
+
+
+@receiver(m2m_changed, sender=FavoriteRecipe.recipe.through)
+@receiver(m2m_changed, sender=ShoppingCart.recipe.through)
+def recipe_counter_changed(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+    field, related_name = RECIPE_COUNTERS[sender]
+    sign = 1 if action == 'post_add' else -1
+    if reverse:
+        owners = getattr(instance, related_name).all()
+        if action == 'post_add':
+            count = len(pk_set)
+        elif action == 'pre_remove':
+            count = owners.filter(id__in=pk_set).count()
+        else:
+            count = owners.count()
+        change_recipe_counter(field, [instance.id], sign * count)
+        return
+    recipes = instance.recipe.values_list('id', flat=True)
+    if action == 'post_add':
+        recipes = pk_set
+    elif action == 'pre_remove':
+        recipes = recipes.filter(id__in=pk_set)
+    change_recipe_counter(field, recipes, sign)
+
+
+@receiver(pre_delete, sender=FavoriteRecipe)
+@receiver(pre_delete, sender=ShoppingCart)
+def recipe_owner_deleted(sender, instance, **kwargs):
+    field, _ = RECIPE_COUNTERS[sender.recipe.through]
+    change_recipe_counter(
+        field, instance.recipe.values_list('id', flat=True), -1)
+
+
+@receiver(post_migrate)
+def search_index_migrated(sender, using, **kwargs):
+    connection = connections[using]
+    if sender.name != 'recipes' or connection.vendor != 'sqlite':
+        return
+    if FTS_TABLE in connection.introspection.table_names():
+        create_sqlite_index(connection)
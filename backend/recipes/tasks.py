@@ -0,0 +1,18 @@
+from jobs.registry import task
+
+from .models import FeedItem, Recipe
+from .thumbnails import has_image_variants, update_image_variants
+
+
+@task
+def generate_image_variants(recipe_id):
+    recipe = Recipe.objects.filter(id=recipe_id).first()
+    if recipe is not None and not has_image_variants(recipe):
+        update_image_variants(recipe)
+
+
+@task
+def fan_out_recipe(recipe_id):
+    recipe = Recipe.objects.filter(id=recipe_id).first()
+    if recipe is not None:
+        FeedItem.objects.fan_out(recipe)
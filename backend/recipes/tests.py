@@ -0,0 +1,201 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db.models import Value
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from foodgram.renderers import ORJSONRenderer
+from .cache import AUTHOR_USER_FIELDS, USER_FIELDS
+from .models import Ingredient, Recipe, RecipeIngredient, Tag
+from .representations import build_recipe_fragments
+from .serializers import RecipeReadSerializer
+from users.models import User
+
+
+def dump(data):
+    """
+    JSON с сохранением порядка ключей, чтобы сравнивать и его.
+    """
+
+    return json.dumps(data, ensure_ascii=False)
+
+
+class RecipeFragmentsTest(TestCase):
+    """
+    Сборка рецептов из строк БД совпадает с вложенными сериализаторами.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Иван', last_name='Петров', password='pass12345!')
+        other = User.objects.create_user(
+            email='other@example.com', username='other',
+            first_name='Анна', last_name='Смирнова', password='pass12345!')
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {index}', color=f'#00000{index}',
+                slug=f'tag{index}')
+            for index in range(4)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'сахар', 'ёжевика', 'соль', 'молоко')
+        ]
+        with_variants = Recipe.objects.create(
+            author=author, name='С копиями картинки', text='Текст\nрецепта',
+            cooking_time=10)
+        with_image = Recipe.objects.create(
+            author=author, name='С картинкой', text='Текст',
+            cooking_time=20)
+        without_image = Recipe.objects.create(
+            author=other, name='Без картинки', text='Текст',
+            cooking_time=30)
+        Recipe.objects.filter(id=with_variants.id).update(
+            image='static/recipe/variants.jpg',
+            image_variants={
+                'source': 'static/recipe/variants.jpg',
+                'card': {'url': 'cache/card.jpg', 'webp': 'cache/card.webp'},
+                'detail': {
+                    'url': 'cache/detail.jpg', 'webp': 'cache/detail.webp'},
+                'retina': {
+                    'url': 'cache/retina.jpg', 'webp': 'cache/retina.webp'},
+            },
+        )
+        Recipe.objects.filter(id=with_image.id).update(
+            image='static/recipe/original.jpg')
+        with_variants.tags.set([tags[2], tags[0], tags[3]])
+        with_image.tags.set([tags[1]])
+        without_image.tags.set(tags)
+        for recipe, used in (
+            (with_variants, (ingredients[3], ingredients[0], ingredients[4])),
+            (with_image, (ingredients[1],)),
+            (without_image, ingredients),
+        ):
+            for amount, ingredient in enumerate(used, start=1):
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=amount * 50)
+
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get(
+            '/api/recipes/', HTTP_HOST='localhost')
+        self.request.user = AnonymousUser()
+
+    def get_recipes(self):
+        return list(Recipe.objects.annotate(
+            is_favorited=Value(False),
+            is_in_shopping_cart=Value(False),
+        ).order_by('id'))
+
+    def get_serializer(self):
+        return RecipeReadSerializer(
+            many=True, context={'request': self.request})
+
+    def strip_user_fields(self, items):
+        fragments = []
+        for item in items:
+            fragment = {
+                field: value for field, value in item.items()
+                if field not in USER_FIELDS
+            }
+            fragment['author'] = {
+                field: value for field, value in item['author'].items()
+                if field not in AUTHOR_USER_FIELDS
+            }
+            fragments.append(fragment)
+        return fragments
+
+    def test_fragments_match_serializers(self):
+        recipes = self.get_recipes()
+        with override_settings(RECIPE_FAST_READ=False):
+            expected = self.strip_user_fields(
+                self.get_serializer().build(recipes))
+        with override_settings(RECIPE_FAST_READ=True):
+            actual = self.get_serializer().build(recipes)
+        self.assertEqual(dump(actual), dump(expected))
+
+    def test_list_matches_serializers(self):
+        with override_settings(RECIPE_FAST_READ=False):
+            expected = self.get_serializer().to_representation(
+                self.get_recipes())
+        cache.clear()
+        with override_settings(RECIPE_FAST_READ=True):
+            actual = self.get_serializer().to_representation(
+                self.get_recipes())
+        self.assertEqual(dump(actual), dump(expected))
+
+    def test_images(self):
+        fragments = {
+            fragment['name']: fragment
+            for fragment in build_recipe_fragments(
+                self.get_recipes(), self.request)
+        }
+        self.assertEqual(
+            fragments['С копиями картинки']['image'],
+            'http://localhost/media/cache/card.jpg')
+        self.assertEqual(
+            fragments['С копиями картинки']['images']['retina']['webp'],
+            'http://localhost/media/cache/retina.webp')
+        self.assertEqual(
+            fragments['С картинкой']['images']['detail'],
+            {'url': 'http://localhost/media/static/recipe/original.jpg',
+             'webp': None})
+        self.assertIsNone(fragments['Без картинки']['image'])
+        self.assertEqual(fragments['Без картинки']['images'], {})
+
+    def test_ordering(self):
+        for fragment in build_recipe_fragments(
+                self.get_recipes(), self.request):
+            tag_ids = [tag['id'] for tag in fragment['tags']]
+            self.assertEqual(tag_ids, sorted(tag_ids, reverse=True))
+            self.assertEqual(
+                [item['id'] for item in fragment['ingredients']],
+                list(RecipeIngredient.objects.filter(
+                    recipe_id=fragment['id']
+                ).values_list('ingredient_id', flat=True)),
+            )
+
+
+class ORJSONRendererTest(TestCase):
+    """
+    Вывод ORJSONRenderer совпадает с JSONRenderer.
+    """
+
+    payloads = (
+        None,
+        {},
+        [],
+        {'text': 'строка с ё и   и  ', 'empty': None},
+        {'count': 3, 'price': Decimal('1.50'), 'ratio': 0.25, 'ok': True},
+        {'date': datetime(2022, 5, 14, 12, 30, 15, 123456, timezone.utc)},
+        {1: 'число в ключе'},
+        ReturnDict({'id': 1, 'tags': ReturnList([{'id': 2}], serializer=None)},
+                   serializer=None),
+    )
+
+    def test_payloads(self):
+        for payload in self.payloads:
+            with self.subTest(payload=payload):
+                self.assertEqual(
+                    ORJSONRenderer().render(payload),
+                    JSONRenderer().render(payload),
+                )
+
+    def test_recipe_fragments(self):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Иван', last_name='Петров', password='pass12345!')
+        Recipe.objects.create(
+            author=author, name='Суп', text='Текст', cooking_time=10)
+        request = RequestFactory().get('/api/recipes/')
+        payload = {'results': build_recipe_fragments(
+            list(Recipe.objects.all()), request)}
+        self.assertEqual(
+            ORJSONRenderer().render(payload), JSONRenderer().render(payload))
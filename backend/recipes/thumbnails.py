@@ -0,0 +1,78 @@
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+IMAGE_FORMATS = {
+    'url': 'JPEG',
+    'webp': 'WEBP',
+}
+
+
+def make_image_variants(image):
+    """
+    Уменьшенные копии картинки всех размеров в JPEG и WebP.
+    Возвращает имена файлов в хранилище по размерам и имя исходной
+    картинки, по которому видно, для какой картинки сделаны копии.
+    """
+
+    variants = {'source': image.name}
+    for size, geometry in settings.RECIPE_IMAGE_SIZES.items():
+        variants[size] = {
+            key: get_thumbnail(
+                image, geometry,
+                crop='center',
+                format=image_format,
+                quality=settings.RECIPE_IMAGE_QUALITY,
+            ).name
+            for key, image_format in IMAGE_FORMATS.items()
+        }
+    return variants
+
+
+def has_image_variants(recipe):
+    if not recipe.image:
+        return not recipe.image_variants
+    return recipe.image_variants.get('source') == recipe.image.name
+
+
+def update_image_variants(recipe):
+    recipe.image_variants = (
+        make_image_variants(recipe.image) if recipe.image else {})
+    recipe.save(update_fields=('image_variants',))
+
+
+def get_image_variants(recipe):
+    """
+    Имена файлов копий картинки рецепта по размерам.
+    Пока копии не готовы, для всех размеров отдается исходная картинка.
+    """
+
+    if not recipe.image:
+        return {}
+    if has_image_variants(recipe):
+        return {
+            size: recipe.image_variants[size]
+            for size in settings.RECIPE_IMAGE_SIZES
+            if size in recipe.image_variants
+        }
+    original = {'url': recipe.image.name, 'webp': None}
+    return {size: original for size in settings.RECIPE_IMAGE_SIZES}
+
+
+def get_image_urls(recipe, request=None):
+    """
+    Ссылки на JPEG и WebP копий картинки рецепта по размерам.
+    С request ссылки абсолютные.
+    """
+
+    def get_url(name):
+        if name is None:
+            return None
+        url = recipe.image.storage.url(name)
+        if request is None:
+            return url
+        return request.build_absolute_uri(url)
+
+    return {
+        size: {key: get_url(name) for key, name in formats.items()}
+        for size, formats in get_image_variants(recipe).items()
+    }
@@ -1,21 +1,30 @@
+from functools import partial
+from itertools import chain
+
 from django.contrib.auth import hashers
-from django.db.models import Sum
-from django.db.models.expressions import Exists, OuterRef, Value
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Count, F, Prefetch, prefetch_related_objects
+from django.db.models.expressions import (Exists, OuterRef, RawSQL, Value,
+                                          Window)
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework.backends import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import filters, permissions, status, viewsets
+from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from foodgram.settings import (URL_PATH, CONSTANT_KEY_MSG,
                                SHOPPING_CATR_FILENAME)
+from .cache import INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY
 from .filters import RecipeFilter
-from .mixins import PermissionAndPaginationMixin
-from .models import (FavoriteRecipe, Ingredient, Recipe, ShoppingCart,
-                     Subscribe, Tag)
+from .mixins import CatalogueVersionMixin, PermissionAndPaginationMixin
+from .paginations import FeedPagination, RecipePagination
+from .models import (FavoriteRecipe, FeedItem, Ingredient, Recipe,
+                     ShoppingCart, Subscribe, Tag)
 from .permissions import IsAuthenticated, IsAuthorOrAdminOrReadOnly
+from .search import ingredient_index
 from .serializers import (IngredientSerializer, RecipeReadSerializer,
                           RecipeWriteSerializer, ShortRecipeSerializer,
                           SubscriptionSerializer, TagSerializer,
@@ -32,13 +41,7 @@ class CustomUsersViewSet(UserViewSet):
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
-        if self.request.user.is_authenticated:
-            is_subscribed = Exists(
-                self.request.user.follower.filter(author=OuterRef('id')))
-            return User.objects.annotate(
-                is_subscribed=is_subscribed
-            ).prefetch_related('follower', 'following')
-        return User.objects.annotate(is_subscribed=Value(False))
+        return User.objects.all()
 
     def get_serializer_class(self):
         if self.request.method.lower() == 'POST':
@@ -50,6 +53,31 @@ class CustomUsersViewSet(UserViewSet):
         password = hashers.make_password(password_field)
         serializer.save(password=password)
 
+    def get_recipes_prefetch(self, subscriptions, limit):
+        """
+        Предзагрузка первых recipes_limit рецептов каждого автора.
+        Рецепты нумеруются оконной функцией ROW_NUMBER() в пределах автора,
+        поэтому для всей страницы подписок нужен один запрос.
+        """
+
+        queryset = Recipe.objects.all()
+        if limit and limit.isdigit():
+            ranked = Recipe.objects.filter(
+                author__in=[item.author_id for item in subscriptions]
+            ).annotate(position=Window(
+                expression=RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )).values('id', 'position')
+            sql, params = ranked.query.sql_with_params()
+            queryset = queryset.filter(id__in=RawSQL(
+                f'SELECT ranked.id FROM ({sql}) AS ranked '
+                f'WHERE ranked.position <= %s',
+                (*params, int(limit))
+            ))
+        return Prefetch(
+            'author__recipe', queryset=queryset, to_attr='recipes_preview')
+
     @action(
         detail=False, methods=['GET', ],
         permission_classes=(IsAuthenticated,),
@@ -61,8 +89,14 @@ class CustomUsersViewSet(UserViewSet):
         """
 
         user = request.user
-        queryset = Subscribe.objects.filter(user=user)
+        queryset = Subscribe.objects.filter(user=user).select_related(
+            'author'
+        ).annotate(recipes_count=Count('author__recipe')).order_by('-id')
         pages = self.paginate_queryset(queryset)
+        prefetch_related_objects(
+            pages, self.get_recipes_prefetch(
+                pages, request.query_params.get('recipes_limit'))
+        )
         serializer = SubscriptionSerializer(
             pages, many=True,
             context={'request': request})
@@ -145,15 +179,29 @@ class CustomUsersViewSet(UserViewSet):
                 status=status.HTTP_201_CREATED)
 
 
-class IngredientsViewSet(PermissionAndPaginationMixin, viewsets.ModelViewSet):
+class IngredientsViewSet(CatalogueVersionMixin, PermissionAndPaginationMixin,
+                         viewsets.ModelViewSet):
     """
     Получение списка ингредиентов или отдельного ингредиента.
     """
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
+    version_key = INGREDIENTS_VERSION_KEY
+
+    def list(self, request, *args, **kwargs):
+        query = (
+            request.query_params.get('name')
+            or request.query_params.get('search')
+        )
+        if not query:
+            return super().list(request, *args, **kwargs)
+        ingredient_index.refresh()
+        return self.conditional_response(
+            self.search, request, query, version=ingredient_index.version)
+
+    def search(self, request, query):
+        return Response(ingredient_index.search(query))
 
 
 class RecipesViewSet(viewsets.ModelViewSet):
@@ -163,29 +211,57 @@ class RecipesViewSet(viewsets.ModelViewSet):
     Работа с избранными рецептами и корзиной покупок.
     """
 
-    queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Recipe.objects.all()
+        if user.is_authenticated:
+            is_favorited = Exists(FavoriteRecipe.objects.filter(
+                user=user, recipe=OuterRef('id')))
+            is_in_shopping_cart = Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('id')))
+            return queryset.annotate(
+                is_favorited=is_favorited,
+                is_in_shopping_cart=is_in_shopping_cart,
+            )
+        return queryset.annotate(
+            is_favorited=Value(False),
+            is_in_shopping_cart=Value(False),
+        )
+
     def get_serializer_class(self):
         if self.request.method in permissions.SAFE_METHODS:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def get_recipe_data(self, recipe):
+        """
+        Данные одного рецепта через общий с выдачей списка кэш.
+        """
+
+        serializer = RecipeReadSerializer(
+            [recipe], many=True,
+            context={'request': self.request, 'image_size': 'detail'}
+        )
+        return serializer.data[0]
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_recipe_data(self.get_object()))
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
-        serializer = RecipeReadSerializer(
-            instance=serializer.instance,
-            context={'request': self.request}
-        )
+        recipe = self.get_queryset().get(id=serializer.instance.id)
         return Response(
-            serializer.data, status=status.HTTP_201_CREATED
+            self.get_recipe_data(recipe), status=status.HTTP_201_CREATED
         )
 
     def update(self, request, *args, **kwargs):
@@ -196,14 +272,32 @@ class RecipesViewSet(viewsets.ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        serializer = RecipeReadSerializer(
-            instance=serializer.instance,
-            context={'request': self.request},
-        )
+        recipe = self.get_queryset().get(id=serializer.instance.id)
         return Response(
-            serializer.data, status=status.HTTP_200_OK
+            self.get_recipe_data(recipe), status=status.HTTP_200_OK
+        )
+
+    @action(
+        methods=['GET', ],
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+    )
+    def feed(self, request):
+        """
+        Новые рецепты авторов, на которых подписан пользователь.
+        """
+
+        paginator = FeedPagination()
+        ids = paginator.paginate_keys(
+            partial(FeedItem.objects.get_keys, request.user), request)
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = RecipeReadSerializer(
+            [recipes[id] for id in ids if id in recipes], many=True,
+            context=self.get_serializer_context(),
         )
+        return paginator.get_paginated_response(serializer.data)
 
+    @transaction.atomic
     def create_favorite(self, request, recipe):
         """
         Добавить рецепт в избранное.
@@ -223,6 +317,7 @@ class RecipesViewSet(viewsets.ModelViewSet):
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete_favorite(self, request, recipe):
         """
         Убрать рецепт из избранного.
@@ -254,6 +349,7 @@ class RecipesViewSet(viewsets.ModelViewSet):
             return self.create_favorite(request, recipe)
         return self.delete_favorite(request, recipe)
 
+    @transaction.atomic
     def add_to_shopping_cart(self, request, recipe):
         """
         Добавление рецептов в список покупок.
@@ -273,6 +369,7 @@ class RecipesViewSet(viewsets.ModelViewSet):
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def remove_from_shopping_cart(self, request, recipe):
         """
         Удаление рецептов из списка покупок.
@@ -309,30 +406,29 @@ class RecipesViewSet(viewsets.ModelViewSet):
         Получение данных для списка покупок.
         """
 
-        return (
-            request.user.shopping_cart.recipe.values(
-                'ingredients__name',
-                'ingredients__measurement_unit'
-            )).annotate(amount=Sum('ingredient__amount')).order_by()
+        return request.user.shopping_cart_ingredients.values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'amount',
+        ).order_by('ingredient__name')
 
     def generate_content_shopping_cart(self, shopping_cart):
         """
-        Формирование списка покупок.
+        Формирование списка покупок построчно в кодировке UTF-8.
         """
 
-        content = '*' * 20 + ' Ваш список покупок ' + '*' * 20 + '\r\n'
-        name = 'ingredients__name'
-        measurement_unit = 'ingredients__measurement_unit'
+        yield ('*' * 20 + ' Ваш список покупок ' + '*' * 20 + '\r\n').encode()
+        name = 'ingredient__name'
+        measurement_unit = 'ingredient__measurement_unit'
         amount = 'amount'
         for ingredient in shopping_cart:
-            content += (
+            yield (
                 f'{ingredient[name]}'
                 f'({ingredient[measurement_unit]})'
                 f' —  {ingredient[amount]}\r\n'
-            )
-        content += 'Благодарим вас за пользование нашим сайтом \r\n'
-        content += URL_PATH
-        return content
+            ).encode()
+        yield 'Благодарим вас за пользование нашим сайтом \r\n'.encode()
+        yield URL_PATH.encode()
 
     @ action(
         methods=['GET', ],
@@ -345,26 +441,30 @@ class RecipesViewSet(viewsets.ModelViewSet):
         Получение файла с списком покупок.
         """
 
-        shopping_cart = self.generate_data_shopping_cart(request)
-        if not shopping_cart:
+        shopping_cart = self.generate_data_shopping_cart(request).iterator()
+        first = next(shopping_cart, None)
+        if first is None:
             return Response(
                 CONSTANT_KEY_MSG['SHOPPING_CART_EMPTY'],
                 status=status.HTTP_400_BAD_REQUEST
             )
-        content = self.generate_content_shopping_cart(shopping_cart)
-        response = HttpResponse(
-            content, content_type='text/plain,charset=utf8'
+        content = self.generate_content_shopping_cart(
+            chain((first,), shopping_cart))
+        response = StreamingHttpResponse(
+            content, content_type='text/plain; charset=utf-8'
         )
         response['Content-Disposition'] = (
-            f'attachment; filename={SHOPPING_CATR_FILENAME}'
+            f'attachment; filename="{SHOPPING_CATR_FILENAME}"'
         )
         return response
 
 
-class TagsViewSet(PermissionAndPaginationMixin, viewsets.ModelViewSet):
+class TagsViewSet(CatalogueVersionMixin, PermissionAndPaginationMixin,
+                  viewsets.ModelViewSet):
     """
     Получение списка тегов или отдельного тега.
     """
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    version_key = TAGS_VERSION_KEY
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import User
+from recipes.paginations import EstimatedCountPaginator
 
 
 @admin.register(User)
@@ -16,3 +17,5 @@ class UserAdmin(admin.ModelAdmin):
     search_fields = ('email', 'username', 'first_name', 'last_name')
     list_filter = ('is_blocked', 'email', 'first_name')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,69 @@
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import User
+
+TOKEN_USER_KEY = 'users:token-user:{}'
+USER_SNAPSHOT_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name',
+    'is_active', 'is_staff', 'is_superuser', 'is_blocked',
+)
+
+
+def get_token_cache_key(key):
+    return TOKEN_USER_KEY.format(sha256(key.encode()).hexdigest())
+
+
+def invalidate_tokens(keys):
+    cache.delete_many([get_token_cache_key(key) for key in keys])
+
+
+def invalidate_user_tokens(user_id):
+    invalidate_tokens(
+        Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+
+def make_user_snapshot(user):
+    return {field: getattr(user, field) for field in USER_SNAPSHOT_FIELDS}
+
+
+def get_snapshot_user(snapshot):
+    """
+    Пользователь из сохраненных в кэше полей.
+    Остальные поля отложены, как у .only(): они загружаются из базы
+    при обращении, а save() записывает только загруженные поля.
+    """
+
+    fields = [
+        field.attname for field in User._meta.concrete_fields
+        if field.attname in snapshot
+    ]
+    return User.from_db(
+        DEFAULT_DB_ALIAS, fields, [snapshot[field] for field in fields])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с кэшированием пользователя.
+    В кэше TOKEN_CACHE_TIMEOUT секунд хранятся только поля, нужные
+    сериализаторам и проверкам прав, без хэша пароля. Запись удаляется
+    после фиксации удаления токена или сохранения пользователя, поэтому
+    блокировка и смена пароля действуют сразу.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = get_token_cache_key(key)
+        snapshot = cache.get(cache_key)
+        if snapshot is not None:
+            user = get_snapshot_user(snapshot)
+            return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        cache.set(
+            cache_key, make_user_snapshot(user),
+            settings.TOKEN_CACHE_TIMEOUT)
+        return user, token